@@ -1,3 +1,14 @@
+from array import array
+from codecs import getincrementaldecoder
+from collections import deque
+import heapq
+from itertools import chain, repeat
+import mmap
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
 from queue import Queue
 
 
@@ -28,8 +39,8 @@ class Node:
 # just so we can avoid the while loop in the search function, as
 # Aho and Corasick's paper describes.
 def get_letters(entries):
-  alphabet = set()
-   for entry in entries:
+    alphabet = set()
+    for entry in entries:
         for c in entry:
             alphabet.add(c)
 
@@ -90,21 +101,582 @@ def build_structure(entries):
     return trie
 
 
-def search(text, entries):
-    lookup = build_structure(entries)
-    node = lookup
-    match_pairs = []
+def search_structure(text, trie):
+    """Scans text with the Node based structure from build_structure()."""
+    node = trie
     for i, c in enumerate(text):
         if c in node.goto:
             node = node.goto[c]
         elif c in node.fail:
-            node = node.fail[c]          
+            node = node.fail[c]
         # This can happen if c is a character that only exists in H but not
         # in S
-        else: 
-            node = lookup
-        matches = node.get_matches()
-        if len(matches) > 0:
-            for match in matches:
-                match_pairs.append((i - len(match) + 1, i + 1))
-    return match_pairs
+        else:
+            node = trie
+        for match in node.get_matches():
+            yield (i - len(match) + 1, i + 1, match)
+
+
+# Match modes of Automaton.finditer()
+OVERLAPPING = 'overlapping'
+LEFTMOST_LONGEST = 'leftmost-longest'
+LEFTMOST_FIRST = 'leftmost-first'
+
+
+class Automaton:
+    """Aho-Corasick automaton compiled once from a list of keywords.
+
+    Instead of Node objects, states are integer ids and every table is a
+    flat array indexed by them. Letters are mapped to small integer codes,
+    code 0 being reserved for letters that do not appear in any keyword,
+    and the transition of state s on code c is
+
+        delta[s * width + c]
+
+    where width is the alphabet size plus one. The failure transitions are
+    folded into delta, so scanning is a single lookup per letter.
+
+    If the keywords are bytes the automaton works in binary mode: letters
+    are byte values, the texts are scanned through a memoryview (so bytes,
+    bytearray, memoryview and mmap objects are read in place, without
+    being copied or decoded) and offsets are in bytes.
+
+    The structure is never modified after construction, so the same
+    instance can be used to search any number of texts, including from
+    several threads at the same time.
+    """
+    def __init__(self, entries):
+        entries = list(entries)
+        self.binary = len(entries) > 0 and not isinstance(entries[0], str)
+        if self.binary:
+            if any(isinstance(entry, str) for entry in entries):
+                raise TypeError('keywords must be all str or all bytes')
+            entries = [bytes(entry) for entry in entries]
+        elif not all(isinstance(entry, str) for entry in entries):
+            raise TypeError('keywords must be all str or all bytes')
+        self.entries = []
+        self.codes = {}
+        for entry in entries:
+            for c in entry:
+                if c not in self.codes:
+                    self.codes[c] = len(self.codes) + 1
+        self.width = len(self.codes) + 1
+        # File the tables are mapped from, see load().
+        self.path = None
+        self._build(entries)
+
+    def _build(self, entries):
+        width = self.width
+        codes = self.codes
+        # Before the failure transitions are filled in, a non-zero entry
+        # of delta is an edge of the trie (the root is never a child).
+        delta = array('i', bytes(4 * width))
+        # Id of the keyword ending at each state or -1.
+        entry = array('i', [-1])
+        # Number of letters from the root to each state.
+        depth = array('i', [0])
+        seen = {}
+        for word in entries:
+            state = 0
+            for c in word:
+                i = state * width + codes[c]
+                if delta[i] == 0:
+                    delta[i] = len(entry)
+                    delta.extend(array('i', bytes(4 * width)))
+                    entry.append(-1)
+                    depth.append(depth[state] + 1)
+                state = delta[i]
+            if word not in seen:
+                seen[word] = len(self.entries)
+                self.entries.append(word)
+            entry[state] = seen[word]
+
+        # Longest proper suffix that is also a state and the next state
+        # along that chain that represents a keyword (or -1).
+        fail = array('i', bytes(4 * len(entry)))
+        output = array('i', [-1]) * len(entry)
+
+        queue = deque([0])
+        while queue:
+            state = queue.popleft()
+            row = state * width
+            fail_row = fail[state] * width
+            for c in range(width):
+                child = delta[row + c]
+                if child == 0:
+                    delta[row + c] = delta[fail_row + c]
+                    continue
+                suffix = delta[fail_row + c] if state != 0 else 0
+                fail[child] = suffix
+                if entry[suffix] != -1:
+                    output[child] = suffix
+                else:
+                    output[child] = output[suffix]
+                queue.append(child)
+
+        # Flatten the output chains: the ids of the keywords matching at
+        # state s, longest first, are out_ids[out_start[s]:out_start[s + 1]].
+        # has_output[s] lets the scan skip the others without touching them.
+        has_output = bytearray(len(entry))
+        out_start = array('i', [0])
+        out_ids = array('i')
+        for state in range(len(entry)):
+            match = state if entry[state] != -1 else output[state]
+            while match != -1:
+                out_ids.append(entry[match])
+                match = output[match]
+            if len(out_ids) != out_start[-1]:
+                has_output[state] = 1
+            out_start.append(len(out_ids))
+
+        self.delta = delta
+        self.depth = depth
+        self.has_output = has_output
+        self.out_start = out_start
+        self.out_ids = out_ids
+        self.ids = seen
+        self.lengths = array('i', [len(word) for word in self.entries])
+        self.max_length = max(self.lengths) if self.lengths else 0
+
+    def finditer(self, text, mode=OVERLAPPING):
+        """Yields (start, end, keyword) for the keywords found in text,
+        ordered by the end position.
+
+        @mode - OVERLAPPING reports every occurrence. LEFTMOST_LONGEST and
+        LEFTMOST_FIRST report non-overlapping matches: scanning from left
+        to right, the match starting first is taken and the scan resumes
+        where it ends. When several keywords start at the same position,
+        LEFTMOST_LONGEST picks the longest one and LEFTMOST_FIRST the one
+        that comes first in the keyword list.
+        """
+        if mode == OVERLAPPING:
+            return self._finditer(self._letters(text))
+        if mode == LEFTMOST_LONGEST:
+            return self._finditer_leftmost(self._letters(text), True)
+        if mode == LEFTMOST_FIRST:
+            return self._finditer_leftmost(self._letters(text), False)
+        raise ValueError('unknown match mode: {}'.format(mode))
+
+    def finditer_stream(self, source, chunk_size=1 << 16, encoding='utf-8'):
+        """Like finditer() but over a sequence of chunks, so the whole text
+        never needs to be in memory.
+
+        @source - a file object, read @chunk_size at a time, or any
+        iterable of str or bytes chunks. Bytes are decoded incrementally
+        with @encoding and offsets are in decoded characters, unless the
+        automaton is in binary mode, in which case chunks must be bytes-like
+        and are scanned as they are.
+
+        The automaton state carries over from one chunk to the next, so
+        keywords that span chunk boundaries are reported and offsets are
+        relative to the start of the stream.
+        """
+        if hasattr(source, 'read'):
+            source = _read_chunks(source, chunk_size)
+        if self.binary:
+            source = map(self._letters, source)
+        else:
+            source = _decode_chunks(source, encoding)
+        return self._finditer(chain.from_iterable(source))
+
+    def _letters(self, text):
+        if self.binary:
+            # Iterating over a byte view yields ints without copying.
+            return memoryview(text).cast('B')
+        return text
+
+    def _finditer(self, text):
+        delta = self.delta
+        width = self.width
+        has_output = self.has_output
+        out_start = self.out_start
+        out_ids = self.out_ids
+        lengths = self.lengths
+        entries = self.entries
+        state = 0
+        for end, c in enumerate(map(self.codes.get, text, repeat(0)), 1):
+            state = delta[state * width + c]
+            if has_output[state]:
+                for i in range(out_start[state], out_start[state + 1]):
+                    k = out_ids[i]
+                    yield (end - lengths[k], end, entries[k])
+
+    def _finditer_leftmost(self, letters, longest):
+        code = self.codes.get
+        delta = self.delta
+        width = self.width
+        depth = self.depth
+        has_output = self.has_output
+        out_start = self.out_start
+        out_ids = self.out_ids
+        lengths = self.lengths
+        size = len(letters)
+        i = 0
+        while i < size:
+            # Restart from the root, so only matches starting at i or later
+            # are seen.
+            state = 0
+            best = None
+            end = i
+            while end < size:
+                state = delta[state * width + code(letters[end], 0)]
+                end += 1
+                if has_output[state]:
+                    # The longest keyword ending here starts leftmost.
+                    k = out_ids[out_start[state]]
+                    start = end - lengths[k]
+                    if best is None or start < best[0] or (
+                            start == best[0] and (longest or k < best[2])):
+                        best = (start, end, k)
+                # Any match found later would start at end - depth[state]
+                # or after, so once that is past the best start it wins.
+                if best is not None and end - depth[state] > best[0]:
+                    break
+            if best is None:
+                return
+            yield (best[0], best[1], self.entries[best[2]])
+            i = best[1]
+
+    def search(self, text, mode=OVERLAPPING):
+        return [(start, end) for start, end, _ in self.finditer(text, mode)]
+
+    def replace(self, text, mapping, mode=LEFTMOST_LONGEST):
+        """Returns text with the keywords found in @mode replaced by
+        mapping[keyword]. Overlapping matches cannot be replaced."""
+        if mode == OVERLAPPING:
+            raise ValueError('replace needs a non-overlapping match mode')
+        pieces = []
+        last = 0
+        for start, end, keyword in self.finditer(text, mode):
+            pieces.append(text[last:start])
+            pieces.append(mapping[keyword])
+            last = end
+        pieces.append(text[last:])
+        return (b'' if self.binary else '').join(pieces)
+
+    def save(self, path):
+        """Writes the compiled automaton to @path so it can be load()ed.
+
+        The file is a header followed by the flat tables exactly as they
+        are in memory (native byte order, each table 8-byte aligned) and
+        the keywords, encoded as UTF-8 unless in binary mode.
+        """
+        letters = array('i', [0]) * (self.width - 1)
+        for c, code in self.codes.items():
+            letters[code - 1] = c if self.binary else ord(c)
+        if self.binary:
+            blobs = self.entries
+        else:
+            blobs = [entry.encode('utf-8') for entry in self.entries]
+        offsets = array('q', [0])
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+
+        num_states = len(self.has_output)
+        header = _FILE_HEADER.pack(
+            _FILE_MAGIC, _FILE_VERSION, _BYTE_ORDER_MARK, int(self.binary),
+            self.width, num_states, len(self.out_ids), len(self.entries))
+        # Processes may have the old file mapped: truncating it under them
+        # would kill them with SIGBUS, so the new file replaces it instead.
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                for table in (letters, self.delta, self.depth,
+                              self.has_output, self.out_start, self.out_ids,
+                              self.lengths, offsets):
+                    f.write(bytes(-f.tell() % 8))
+                    f.write(table)
+                f.write(b''.join(blobs))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Opens an automaton written by save().
+
+        The file is memory mapped and the tables are used in place, so
+        loading does not depend on the number of states, and processes
+        loading the same file share its pages through the page cache. Only
+        the keyword list and the letter codes are copied into memory.
+        """
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        (magic, version, byte_order, binary, width, num_states, num_outputs,
+         num_entries) = _FILE_HEADER.unpack_from(data)
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            raise ValueError('{} is not an automaton file'.format(path))
+        if byte_order != _BYTE_ORDER_MARK:
+            raise ValueError('{} was saved with another byte order'.format(
+                path))
+
+        view = memoryview(data)
+        position = _FILE_HEADER.size
+
+        def table(fmt, count):
+            nonlocal position
+            position += -position % 8
+            size = count * array(fmt).itemsize
+            result = view[position:position + size].cast(fmt)
+            position += size
+            return result
+
+        automaton = cls.__new__(cls)
+        automaton.binary = bool(binary)
+        automaton.width = width
+        letters = table('i', width - 1)
+        automaton.delta = table('i', num_states * width)
+        automaton.depth = table('i', num_states)
+        automaton.has_output = table('B', num_states)
+        automaton.out_start = table('i', num_states + 1)
+        automaton.out_ids = table('i', num_outputs)
+        automaton.lengths = table('i', num_entries)
+        offsets = table('q', num_entries + 1)
+
+        if automaton.binary:
+            automaton.codes = {c: code for code, c in enumerate(letters, 1)}
+        else:
+            automaton.codes = {chr(c): code
+                               for code, c in enumerate(letters, 1)}
+        blob = data[position:position + offsets[-1]]
+        automaton.entries = [blob[offsets[k]:offsets[k + 1]]
+                             for k in range(num_entries)]
+        if not automaton.binary:
+            automaton.entries = [entry.decode('utf-8')
+                                 for entry in automaton.entries]
+        automaton.ids = {entry: k for k, entry in enumerate(automaton.entries)}
+        automaton.max_length = max(automaton.lengths, default=0)
+        automaton.path = path
+        automaton._file_id = (stat.st_dev, stat.st_ino)
+        automaton._data = data
+        return automaton
+
+    def __getstate__(self):
+        # A mapped automaton is sent to other processes by path, so they
+        # map the same file instead of receiving a copy of the tables. The
+        # file id tells whether the path still names that file: save()
+        # replaces the file, so it gets a new one.
+        if self.path is not None:
+            return {'path': self.path, 'file_id': self._file_id}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if state.get('path') is not None:
+            automaton = Automaton.load(state['path'])
+            if automaton._file_id != state['file_id']:
+                raise ValueError('{} was replaced after the automaton was '
+                                 'loaded'.format(state['path']))
+            state = automaton.__dict__
+        self.__dict__.update(state)
+
+    def search_parallel(self, text, processes=None, partitions=None):
+        """Same result as search(text), computed by a pool of @processes
+        worker processes (one per CPU by default).
+
+        The text is cut into @partitions pieces (a few per process by
+        default) and each piece is scanned starting max_length - 1 letters
+        before it, so keywords crossing the cut are seen. A match is only
+        reported by the piece containing its end, so there is nothing to
+        deduplicate and concatenating the pieces in order gives exactly the
+        order of search().
+
+        Where available the pool is forked, so the workers share the
+        automaton and the text with the parent instead of receiving copies.
+        """
+        return self._search_parallel(
+            len(self._letters(text)), processes, partitions, text=text)
+
+    def search_file_parallel(self, path, processes=None, partitions=None):
+        """Like search_parallel() over the contents of the file at @path.
+
+        Every worker memory maps the file itself, so it is never read
+        into the parent. Only binary mode automata can do this, since a
+        cut could fall in the middle of an encoded character.
+        """
+        if not self.binary:
+            raise ValueError('files can only be scanned in binary mode')
+        return self._search_parallel(
+            os.path.getsize(path), processes, partitions, path=path)
+
+    def _search_parallel(self, size, processes, partitions, text=None,
+                         path=None):
+        if size == 0:
+            return []
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if partitions is None:
+            partitions = 4 * processes
+        step = max(-(-size // partitions), self.max_length, 1)
+        bounds = [(lo, min(lo + step, size)) for lo in range(0, size, step)]
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+        with context.Pool(processes, _init_worker,
+                          (self, text, path)) as pool:
+            pieces = pool.map(_search_partition, bounds)
+        return list(chain.from_iterable(pieces))
+
+    def _search_range(self, text, lo, hi):
+        begin = max(0, lo - self.max_length + 1)
+        letters = self._letters(text)[begin:hi]
+        return [(begin + start, begin + end)
+                for start, end, _ in self._finditer(letters)
+                if begin + end > lo]
+
+
+class DynamicAutomaton:
+    """Set of keywords that can be searched while keywords are added and
+    removed.
+
+    A compiled Automaton cannot be patched in place: a new keyword changes
+    the failure transitions of every state whose suffix it becomes. So the
+    keywords are kept in a few Automaton levels instead, largest first,
+    much like a log-structured merge tree. Added keywords become a new
+    level, and whenever a level is at least half the size of the one
+    before, both are rebuilt as one. Each keyword is thus rebuilt
+    O(log n) times overall and an update costs time proportional to its
+    size, amortized. Removed keywords are hidden from the results until
+    the level holding them is rebuilt, or the whole set is rebuilt once a
+    quarter of it has been removed.
+
+    Updates are serialized by a lock and publish a new immutable snapshot
+    of the levels. A search uses the snapshot taken when it starts, so it
+    never sees a half applied update.
+    """
+    def __init__(self, entries=()):
+        self._lock = threading.Lock()
+        levels = (Automaton(entries),)
+        self._snapshot = (_nonempty(levels), frozenset())
+
+    def __len__(self):
+        levels, removed = self._snapshot
+        return sum(len(level.entries) for level in levels) - len(removed)
+
+    def __contains__(self, entry):
+        levels, removed = self._snapshot
+        return entry not in removed and any(
+            entry in level.ids for level in levels)
+
+    def add(self, entry):
+        self.update(added=[entry])
+
+    def remove(self, entry):
+        if entry not in self:
+            raise KeyError(entry)
+        self.update(removed=[entry])
+
+    def update(self, added=(), removed=()):
+        """Adds and removes several keywords in a single update. Keywords
+        already present are not added again and missing ones are not
+        removed."""
+        with self._lock:
+            levels, hidden = self._snapshot
+            hidden = set(hidden)
+            # Keywords of the new level, in insertion order.
+            fresh = {}
+            for entry in added:
+                if entry in hidden:
+                    hidden.discard(entry)
+                elif not any(entry in level.ids for level in levels):
+                    fresh[entry] = None
+            for entry in removed:
+                if entry in fresh:
+                    del fresh[entry]
+                elif any(entry in level.ids for level in levels):
+                    hidden.add(entry)
+
+            levels = list(levels)
+            if fresh:
+                levels.append(Automaton(fresh))
+            while len(levels) > 1 and \
+                    2 * len(levels[-1].entries) >= len(levels[-2].entries):
+                levels[-2:] = [self._merge(levels[-2:], hidden)]
+            live = sum(len(level.entries) for level in levels) - len(hidden)
+            if 4 * len(hidden) > live:
+                levels = [self._merge(levels, hidden)]
+            self._snapshot = (_nonempty(levels), frozenset(hidden))
+
+    def _merge(self, levels, hidden):
+        entries = []
+        for level in levels:
+            for entry in level.entries:
+                if entry in hidden:
+                    hidden.discard(entry)
+                else:
+                    entries.append(entry)
+        return Automaton(entries)
+
+    def finditer(self, text):
+        """Yields (start, end, keyword) for every occurrence of a keyword
+        in text, in the same order as Automaton.finditer()."""
+        levels, removed = self._snapshot
+        matches = [level.finditer(text) for level in levels]
+        if removed:
+            matches = [(match for match in level if match[2] not in removed)
+                       for level in matches]
+        return heapq.merge(*matches, key=lambda match: (match[1], match[0]))
+
+    def search(self, text):
+        return [(start, end) for start, end, _ in self.finditer(text)]
+
+
+def _nonempty(levels):
+    return tuple(level for level in levels if level.entries)
+
+
+# Layout of the header of the files written by Automaton.save(): magic,
+# version, byte order mark, binary flag, width, number of states, length
+# of out_ids and number of keywords.
+_FILE_HEADER = struct.Struct('=8sIIIIIII')
+_FILE_MAGIC = b'AHOCORAS'
+_FILE_VERSION = 1
+_BYTE_ORDER_MARK = 0x01020304
+
+
+# Automaton and text of a search_parallel() worker process.
+_worker_automaton = None
+_worker_text = None
+
+
+def _init_worker(automaton, text, path):
+    global _worker_automaton, _worker_text
+    _worker_automaton = automaton
+    if path is not None:
+        with open(path, 'rb') as f:
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _worker_text = text
+
+
+def _search_partition(bounds):
+    lo, hi = bounds
+    return _worker_automaton._search_range(_worker_text, lo, hi)
+
+
+def _read_chunks(stream, chunk_size):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _decode_chunks(chunks, encoding):
+    decoder = None
+    for chunk in chunks:
+        if not isinstance(chunk, str):
+            if decoder is None:
+                decoder = getincrementaldecoder(encoding)()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
+
+
+def search(text, entries):
+    return Automaton(entries).search(text)
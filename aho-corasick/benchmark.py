@@ -0,0 +1,180 @@
+"""Benchmarks the Aho-Corasick implementations.
+
+For every combination of dictionary size, alphabet size, keyword length
+distribution and match density it measures, for each engine, the build
+time, the peak memory allocated while building and the scan throughput,
+and prints the results as JSON:
+
+    python benchmark.py --text-size 1000000 --output results.json
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+from aho_corasick import Automaton, build_structure, search_structure
+
+
+# Keyword lengths are drawn uniformly from these ranges.
+LENGTHS = {
+    'short': (2, 6),
+    'long': (8, 24),
+}
+
+
+def random_dictionary(size, alphabet, lengths, rng):
+    low, high = LENGTHS[lengths]
+    words = set()
+    while len(words) < size:
+        length = rng.randint(low, high)
+        words.add(''.join(rng.choice(alphabet) for _ in range(length)))
+    return sorted(words)
+
+
+def random_text(size, alphabet, words, density, rng):
+    """Random letters from @alphabet where about a @density fraction of
+    the text is covered by keywords planted at random positions."""
+    letters = [rng.choice(alphabet) for _ in range(size)]
+    covered = 0
+    while words and covered < density * size:
+        word = rng.choice(words)
+        start = rng.randrange(max(1, size - len(word)))
+        letters[start:start + len(word)] = word
+        covered += len(word)
+    return ''.join(letters[:size])
+
+
+def naive_search(text, words):
+    """Baseline: finds every occurrence of each keyword with str.find."""
+    matches = []
+    for word in words:
+        start = text.find(word)
+        while start != -1:
+            matches.append((start, start + len(word)))
+            start = text.find(word, start + 1)
+    return matches
+
+
+class NodeEngine:
+    name = 'node'
+
+    def build(self, words):
+        return build_structure(words)
+
+    def scan(self, trie, text):
+        return sum(1 for _ in search_structure(text, trie))
+
+
+class AutomatonEngine:
+    name = 'automaton'
+
+    def build(self, words):
+        return Automaton(words)
+
+    def scan(self, automaton, text):
+        return sum(1 for _ in automaton.finditer(text))
+
+
+class NaiveEngine:
+    name = 'naive'
+
+    def build(self, words):
+        return words
+
+    def scan(self, words, text):
+        return len(naive_search(text, words))
+
+
+ENGINES = [NodeEngine(), AutomatonEngine(), NaiveEngine()]
+
+
+def measure(engine, words, text):
+    tracemalloc.start()
+    engine.build(words)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    structure = engine.build(words)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = engine.scan(structure, text)
+    scan_time = time.perf_counter() - start
+
+    megabytes = len(text.encode('utf-8')) / 1e6
+    return {
+        'engine': engine.name,
+        'build_seconds': build_time,
+        'build_peak_bytes': peak,
+        'scan_seconds': scan_time,
+        'scan_mb_per_second': megabytes / scan_time if scan_time else None,
+        'matches': matches,
+    }
+
+
+def benchmark(dictionary_sizes, alphabet_sizes, lengths, densities,
+              text_size, engines, max_naive_words, seed=0):
+    results = []
+    for num_words in dictionary_sizes:
+        for alphabet_size in alphabet_sizes:
+            alphabet = string.ascii_letters[:alphabet_size]
+            for length in lengths:
+                for density in densities:
+                    rng = random.Random(seed)
+                    words = random_dictionary(num_words, alphabet, length, rng)
+                    text = random_text(text_size, alphabet, words, density,
+                                       rng)
+                    for engine in engines:
+                        if engine.name == 'naive' and \
+                                num_words > max_naive_words:
+                            continue
+                        result = measure(engine, words, text)
+                        result.update({
+                            'dictionary_size': num_words,
+                            'alphabet_size': alphabet_size,
+                            'lengths': length,
+                            'density': density,
+                            'text_size': text_size,
+                        })
+                        print(json.dumps(result), file=sys.stderr)
+                        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dictionary-sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('--alphabet-sizes', type=int, nargs='+',
+                        default=[4, 26])
+    parser.add_argument('--lengths', nargs='+', choices=sorted(LENGTHS),
+                        default=sorted(LENGTHS))
+    parser.add_argument('--densities', type=float, nargs='+',
+                        default=[0.0, 0.01, 0.1])
+    parser.add_argument('--text-size', type=int, default=1000000)
+    parser.add_argument('--engines', nargs='+',
+                        choices=[engine.name for engine in ENGINES],
+                        default=[engine.name for engine in ENGINES])
+    parser.add_argument('--max-naive-words', type=int, default=1000,
+                        help='skip the naive baseline for larger dictionaries')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the JSON results to')
+    args = parser.parse_args()
+
+    engines = [engine for engine in ENGINES if engine.name in args.engines]
+    results = benchmark(args.dictionary_sizes, args.alphabet_sizes,
+                        args.lengths, args.densities, args.text_size, engines,
+                        args.max_naive_words, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,12 @@
+import io
+import mmap
+import os
+import pickle
+import random
+import tempfile
 import unittest
-from aho_corasick import search
+from aho_corasick import (Automaton, DynamicAutomaton, LEFTMOST_FIRST,
+                          LEFTMOST_LONGEST, search)
 
 
 class TestAhoCorasick(unittest.TestCase):
@@ -17,6 +24,146 @@ class TestAhoCorasick(unittest.TestCase):
         self.assertEquals([(0, 1), (0, 2), (1, 2), (0, 3),
                            (1, 3), (2, 3), (1, 4), (2, 4), (3, 4)], matches)
 
+    def testAutomatonIsReusable(self):
+        automaton = Automaton(['he', 'she', 'his', 'hers'])
+        self.assertEqual([(1, 4), (2, 4), (2, 6)],
+                         automaton.search('ushers'))
+        self.assertEqual([(0, 3)], automaton.search('his'))
+        self.assertEqual([(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')],
+                         list(automaton.finditer('ushers')))
+
+    def testStreamMatchesSpanningChunks(self):
+        automaton = Automaton(['he', 'she', 'his', 'hers'])
+        chunks = ['us', 'h', 'ers hi', 's']
+        self.assertEqual(list(automaton.finditer(''.join(chunks))),
+                         list(automaton.finditer_stream(chunks)))
+
+    def testStreamFromBinaryFile(self):
+        automaton = Automaton(['caf\u00e9', 'fe'])
+        stream = io.BytesIO(u'un caf\u00e9 fe'.encode('utf-8'))
+        self.assertEqual([(3, 7, 'caf\u00e9'), (8, 10, 'fe')],
+                         list(automaton.finditer_stream(stream, chunk_size=7)))
+
+    def testBinaryMode(self):
+        automaton = Automaton([b'\x00\xff', b'\xff'])
+        data = b'a\x00\xff\xff'
+        expected = [(1, 3, b'\x00\xff'), (2, 3, b'\xff'), (3, 4, b'\xff')]
+        self.assertEqual(expected, list(automaton.finditer(data)))
+        self.assertEqual(expected,
+                         list(automaton.finditer(memoryview(data))))
+        self.assertEqual(expected, list(automaton.finditer_stream(
+            [b'a\x00', bytearray(b'\xff\xff')])))
+
+    def testBinaryModeOverMmap(self):
+        automaton = Automaton([u'caf\u00e9'.encode('utf-8')])
+        with tempfile.TemporaryFile() as f:
+            f.write(u'un caf\u00e9'.encode('utf-8'))
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.assertEqual([(3, 8)], automaton.search(mm))
+
+    def testMixedKeywordTypes(self):
+        self.assertRaises(TypeError, Automaton, ['a', b'b'])
+
+    def testParallelSearchMatchesSequentialSearch(self):
+        rng = random.Random(0)
+        automaton = Automaton(['ab', 'bab', 'abba', 'b'])
+        text = ''.join(rng.choice('abc') for _ in range(1000))
+        self.assertEqual(automaton.search(text),
+                         automaton.search_parallel(text, 2, partitions=7))
+
+    def testParallelFileSearch(self):
+        automaton = Automaton([b'ab', b'bab', b'abba', b'b'])
+        data = b'abbabcab' * 100
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            self.assertEqual(
+                automaton.search(data),
+                automaton.search_file_parallel(f.name, 2, partitions=9))
+
+    def testLeftmostLongest(self):
+        automaton = Automaton(['a', 'aa', 'aaa'])
+        self.assertEqual([(0, 3), (3, 4)],
+                         automaton.search('aaaa', LEFTMOST_LONGEST))
+        automaton = Automaton(['abcd', 'bc', 'b', 'abx'])
+        self.assertEqual([(1, 3)],
+                         automaton.search('abcx', LEFTMOST_LONGEST))
+
+    def testLeftmostFirst(self):
+        automaton = Automaton(['sam', 'samwise'])
+        self.assertEqual([(0, 3)], automaton.search('samwise', LEFTMOST_FIRST))
+        self.assertEqual([(0, 7)], automaton.search('samwise', LEFTMOST_LONGEST))
+        automaton = Automaton(['a', 'aa', 'aaa'])
+        self.assertEqual([(0, 1), (1, 2), (2, 3), (3, 4)],
+                         automaton.search('aaaa', LEFTMOST_FIRST))
+
+    def testReplace(self):
+        automaton = Automaton(['he', 'she', 'his', 'hers'])
+        mapping = {'he': 'X', 'she': 'Y', 'his': 'Z', 'hers': 'W'}
+        self.assertEqual('uYrs Z W', automaton.replace('ushers his hers',
+                                                        mapping))
+        automaton = Automaton([b'\xff'])
+        self.assertEqual(b'a--b', automaton.replace(b'a\xffb', {b'\xff': b'--'}))
+
+    def testSaveAndLoad(self):
+        cases = [(['he', 'she', 'his', 'hers', u'caf\u00e9'],
+                  u'ushers caf\u00e9 his'),
+                 ([b'\x00\xff', b'\xff'], b'a\x00\xff\xff'),
+                 ([], 'abc')]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'automaton')
+            for entries, text in cases:
+                automaton = Automaton(entries)
+                automaton.save(path)
+                loaded = Automaton.load(path)
+                self.assertEqual(list(automaton.finditer(text)),
+                                 list(loaded.finditer(text)))
+                self.assertEqual(automaton.search(text, LEFTMOST_LONGEST),
+                                 loaded.search(text, LEFTMOST_LONGEST))
+                copy = pickle.loads(pickle.dumps(loaded))
+                self.assertEqual(automaton.search(text), copy.search(text))
+
+    def testSaveOverLoadedFile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'automaton')
+            Automaton(['he', 'she']).save(path)
+            loaded = Automaton.load(path)
+            pickled = pickle.dumps(loaded)
+            loaded.save(path)
+            Automaton(['his', 'hers']).save(path)
+            # The old mapping stays valid, the file holds the new version
+            self.assertEqual([(1, 4), (2, 4)], loaded.search('ushe'))
+            self.assertEqual([(0, 3)], Automaton.load(path).search('his'))
+            self.assertEqual(['automaton'], os.listdir(directory))
+            # A copy pickled from the old mapping must not use the new file
+            self.assertRaises(ValueError, pickle.loads, pickled)
+
+    def testDynamicAutomaton(self):
+        rng = random.Random(0)
+        words = set()
+        automaton = DynamicAutomaton()
+        text = ''.join(rng.choice('abc') for _ in range(200))
+        for _ in range(300):
+            word = ''.join(rng.choice('abc') for _ in range(rng.randint(1, 6)))
+            if word in words:
+                words.remove(word)
+                automaton.remove(word)
+            else:
+                words.add(word)
+                automaton.add(word)
+            self.assertEqual(len(words), len(automaton))
+            self.assertEqual(Automaton(sorted(words)).search(text),
+                             automaton.search(text))
+        self.assertRaises(KeyError, automaton.remove, 'abcabcabc')
+
+    def testDynamicAutomatonSnapshot(self):
+        automaton = DynamicAutomaton(['he', 'she'])
+        matches = automaton.finditer('ushers')
+        automaton.update(added=['hers'], removed=['he'])
+        self.assertEqual([(1, 4, 'she'), (2, 4, 'he')], list(matches))
+        self.assertEqual([(1, 4), (2, 6)], automaton.search('ushers'))
+
 
 if __name__ == '__main__':
     unittest.main()
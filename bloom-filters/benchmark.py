@@ -0,0 +1,190 @@
+"""Benchmarks the Bloom filter variants of bloom.py.
+
+For every filter size and number of hash functions it fills a classic,
+a blocked and a counting filter with size/bits_per_value distinct keys
+(and a scalable filter targeting the classic one's error rate), then
+measures:
+
+- insert and query throughput, for batches and for single values;
+- memory taken by the filter;
+- the false positive rate measured on keys that were not inserted,
+  next to the theoretical one.
+
+Results are printed as a table, and optionally written as JSON:
+
+    python benchmark.py --sizes 1e3 1e6 1e9 --json results.json
+"""
+import argparse
+import json
+import time
+
+from bloom import (BloomFilter, BlockedBloomFilter, CountingBloomFilter,
+                   ScalableBloomFilter, _falsePositiveRate, _numHashes)
+from hashers import HASHERS
+
+VARIANTS = ['classic', 'blocked', 'counting', 'scalable']
+
+# Smallest initial capacity of the scalable filter.
+MIN_INITIAL_CAPACITY = 1000
+
+# Result key, table header, column width and format of the values.
+COLUMNS = [
+    ('variant', 'variant', 9, ''),
+    ('size', 'bits', 11, ''),
+    ('num_hashes', 'k', 5, ''),
+    ('num_values', 'values', 10, ''),
+    ('memory_bytes', 'memory', 11, ''),
+    ('insert_per_second', 'insert/s', 10, '.0f'),
+    ('query_per_second', 'query/s', 10, '.0f'),
+    ('single_insert_per_second', '1 insert/s', 10, '.0f'),
+    ('single_query_per_second', '1 query/s', 10, '.0f'),
+    ('false_positive_rate', 'fp rate', 9, '.6f'),
+    ('theoretical_rate', 'expected', 9, '.6f'),
+]
+
+
+def make_filter(variant, size, num_values, num_hashes, hasher):
+    if variant == 'classic':
+        return BloomFilter(size, num_values, num_hashes, hasher=hasher)
+    if variant == 'blocked':
+        return BlockedBloomFilter(size, num_values, num_hashes, hasher=hasher)
+    if variant == 'counting':
+        return CountingBloomFilter(size, num_values, num_hashes,
+                                   hasher=hasher)
+    # Same expected error as the classic filter, without knowing the
+    # number of values up front. It starts at 1/16 of them, but not so
+    # small that its first filters are mostly overhead.
+    k = _numHashes(size, num_values, num_hashes)
+    error_rate = max(_falsePositiveRate(size, k, num_values), 1e-9)
+    return ScalableBloomFilter(
+        error_rate, initial_capacity=max(MIN_INITIAL_CAPACITY,
+                                         num_values // 16),
+        hasher=hasher)
+
+
+def memory_usage(bf):
+    if isinstance(bf, ScalableBloomFilter):
+        return bf.memory_usage()
+    if isinstance(bf, CountingBloomFilter):
+        return bf.counters.nbytes
+    return (bf.size + 7)//8
+
+
+def theoretical_rate(bf, num_values):
+    if isinstance(bf, ScalableBloomFilter):
+        return bf.false_positive_rate()
+    return bf.false_positive_rate(num_values)
+
+
+def batches(start, stop, batch_size):
+    for lo in range(start, stop, batch_size):
+        yield range(lo, min(lo + batch_size, stop))
+
+
+def measure(variant, size, num_values, num_hashes, hasher, num_probes,
+            num_single, batch_size):
+    bf = make_filter(variant, size, num_values, num_hashes, hasher)
+
+    start = time.perf_counter()
+    for batch in batches(0, num_values, batch_size):
+        bf.insert_many(batch)
+    insert_time = time.perf_counter() - start
+
+    # Keys >= num_values were never inserted.
+    false_positives = 0
+    start = time.perf_counter()
+    for batch in batches(num_values, num_values + num_probes, batch_size):
+        false_positives += int(bf.query_many(batch).sum())
+    query_time = time.perf_counter() - start
+
+    single = min(num_single, num_values)
+    start = time.perf_counter()
+    for i in range(single):
+        bf.query(i)
+    single_query_time = time.perf_counter() - start
+
+    # Fresh keys, after those probed, so that no variant sees a repeat:
+    # a counting filter would increment its counters again.
+    fresh = num_values + num_probes
+    start = time.perf_counter()
+    for i in range(fresh, fresh + single):
+        bf.insert(i)
+    single_insert_time = time.perf_counter() - start
+
+    return {
+        'variant': variant,
+        'size': size,
+        'num_hashes': getattr(bf, 'numHashes', 'auto'),
+        'num_values': num_values,
+        'memory_bytes': memory_usage(bf),
+        'insert_per_second': num_values/insert_time,
+        'query_per_second': num_probes/query_time,
+        'single_insert_per_second': single/single_insert_time,
+        'single_query_per_second': single/single_query_time,
+        'false_positive_rate': false_positives/num_probes,
+        'theoretical_rate': theoretical_rate(bf, num_values),
+    }
+
+
+def benchmark(sizes, num_hashes_values, variants, bits_per_value, hasher,
+              num_probes, num_single, batch_size):
+    results = []
+    for size in sizes:
+        num_values = max(1, int(size/bits_per_value))
+        for num_hashes in num_hashes_values:
+            for variant in variants:
+                # The scalable filter picks its own number of hashes.
+                if variant == 'scalable' and num_hashes != num_hashes_values[0]:
+                    continue
+                result = measure(variant, size, num_values, num_hashes,
+                                 hasher, num_probes, num_single, batch_size)
+                print_row(result)
+                results.append(result)
+    return results
+
+
+def print_header():
+    print(' '.join(header.rjust(width) for _, header, width, _ in COLUMNS))
+
+
+def print_row(result):
+    print(' '.join(format(result[key], spec).rjust(width)
+                   for key, _, width, spec in COLUMNS), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=float, nargs='+',
+                        default=[1e3, 1e4, 1e5, 1e6, 1e7],
+                        help='filter sizes in bits, up to 1e9')
+    parser.add_argument('--num-hashes', type=int, nargs='+',
+                        default=[0, 3, 7],
+                        help='numbers of hash functions, 0 for the default '
+                             'computed from the size')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS,
+                        default=VARIANTS)
+    parser.add_argument('--bits-per-value', type=float, default=10)
+    parser.add_argument('--hasher', default='Murmur3Hasher',
+                        choices=[h.__name__ for h in HASHERS])
+    parser.add_argument('--probes', type=int, default=100000,
+                        help='keys not inserted used to measure false '
+                             'positives')
+    parser.add_argument('--single', type=int, default=10000,
+                        help='keys inserted and queried one at a time')
+    parser.add_argument('--batch-size', type=int, default=100000)
+    parser.add_argument('--json', help='file to write the results to')
+    args = parser.parse_args()
+
+    hasher = next(h for h in HASHERS if h.__name__ == args.hasher)
+    print_header()
+    num_hashes = [k if k > 0 else None for k in args.num_hashes]
+    results = benchmark([int(size) for size in args.sizes], num_hashes,
+                        args.variants, args.bits_per_value, hasher,
+                        args.probes, args.single, args.batch_size)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,31 @@
 # pip install bitarray
 # pip install mmh3
+# pip install numpy
 from bitarray import bitarray
-from mmh3 import hash128 
-from math import log
+from concurrent.futures import Future, ProcessPoolExecutor
+from hashers import HASHERS, Murmur3Hasher
+from math import ceil, exp, lgamma, log, sqrt
+import json
+import mmap
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import os
+import struct
+import sys
+import tempfile
+
+# Smallest filter of a ScalableBloomFilter, in bits.
+SCALABLE_MIN_BITS = 4096
+
+# Bits per block of BlockedBloomFilter: a 64 bytes cache line.
+BLOCK_BITS = 512
+
+# Mask of the i-th bit of a byte in a big endian bitarray.
+_BIT_MASKS = np.array([0x80 >> i for i in range(8)], dtype=np.uint8)
 
 class BloomFilter:
-    def __init__(self, size, num_values, num_hashes=None):
+    def __init__(self, size, num_values, num_hashes=None, seed=0,
+                 hasher=Murmur3Hasher):
         """Simple implementation of a Bloom filter.
 
         It stores a bit array internally of @size bits and expects
@@ -19,35 +39,188 @@ class BloomFilter:
 
         @num_hashes - number of hash functions (optional). If not
         provided, it's calculated from @size and @num_values
+
+        @seed - seed of the hash function (optional)
+
+        @hasher - class of the hash function, see hashers.py (optional).
+        By default values are converted with str() and hashed with murmur3
         """
         self.size = size
-        self.bitArr = bitarray(size)
-        self.bitArr.setall(False)
+        self.seed = seed
+        self.hasher = hasher(seed)
+        self.bitArr = self._allocate(size)
 
-        # Number of hash functions that minimizes the
-        # probability of false positives
-        if num_hashes is None:
-            self.numHashes = max(5, int(log(2)*size/num_values))
-        else:
-            self.numHashes = num_hashes
+        self.numHashes = _numHashes(size, num_values, num_hashes)
 
     def insert(self, value):
-        hashes = self.__getHashes(value)
+        hashes = self._getHashes(value)
         for h in hashes:
             self.bitArr[h] = True
 
     def query(self, value):
-        hashes = self.__getHashes(value)
+        hashes = self._getHashes(value)
         #print value, hashes
         return all(map(lambda h: self.bitArr[h], hashes))
 
+    def insert_many(self, values):
+        """Inserts every value of the iterable @values.
+
+        The bit indexes of the whole batch are computed as one NumPy array
+        and set directly in the bitarray's buffer.
+        """
+        self._insertHashes(self._getHashesMany(values))
+
+    def query_many(self, values):
+        """Returns a boolean NumPy array telling, for each value of the
+        iterable @values, whether query(value) is true."""
+        return self._queryHashes(self._getHashesMany(values))
+
+    def _insertHashes(self, indexes):
+        # NumPy would write through the buffer of a read-only mapping, see
+        # open(), so refuse like bitarray does.
+        if self.bitArr.readonly:
+            raise TypeError('cannot modify read-only memory')
+        bits = np.frombuffer(self.bitArr, dtype=np.uint8)
+        np.bitwise_or.at(bits, indexes >> 3, _BIT_MASKS[indexes & 7])
+
+    def _queryHashes(self, indexes):
+        bits = np.frombuffer(self.bitArr, dtype=np.uint8)
+        return (bits[indexes >> 3] & _BIT_MASKS[indexes & 7]).all(axis=1)
+
     def count(self, boolean):
-        return self.bitArr.count(boolean)
+        # A file backed bitarray may be longer than size, see open().
+        return self.bitArr.count(boolean, 0, self.size)
+
+    def save(self, path):
+        """Writes the filter to @path: a header with its parameters
+        followed by the bits, so that it can be open()ed later.
+
+        An existing file at @path is replaced, not overwritten: filters
+        already open()ed from it keep using the previous version."""
+        header = _FILE_HEADER.pack(
+            _FILE_MAGIC, _FILE_VERSION, _LAYOUTS.index(type(self)),
+            self.size, self.numHashes, self.seed,
+            HASHERS.index(type(self.hasher)))
+        # Processes may have the old file mapped, this one included, and
+        # truncating it under them would crash them. The new file replaces
+        # it instead.
+        fd, tempPath = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header.ljust(_FILE_DATA_OFFSET, b'\0'))
+                f.write(self.bitArr)
+            os.replace(tempPath, path)
+        except BaseException:
+            os.unlink(tempPath)
+            raise
+
+    @classmethod
+    def open(cls, path, writable=False):
+        """Opens a filter written by save() without reading it.
+
+        The bits stay in the file and are memory mapped, so opening is
+        immediate whatever the size, and processes opening the same file
+        share a single copy through the page cache. The filter is read
+        only unless @writable, in which case inserts go to the file.
+        """
+        with open(path, 'r+b' if writable else 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=(
+                mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ))
+        magic, version, layout, size, num_hashes, seed, hasher = \
+            _FILE_HEADER.unpack_from(data)
+        if magic != _FILE_MAGIC or version not in (1, _FILE_VERSION):
+            raise ValueError('{} is not a bloom filter file'.format(path))
 
-    def __getHashes(self, value):
-        h128 = hash128(str(value))
-        h64l = h128 & ((1 << 64) - 1)
-        h64u = h128 >> 64
+        bf = _LAYOUTS[layout].__new__(_LAYOUTS[layout])
+        bf.size = size
+        bf.numHashes = num_hashes
+        bf.seed = seed
+        bf.hasher = HASHERS[hasher](seed)
+        if isinstance(bf, BlockedBloomFilter):
+            bf.numBlocks = size // BLOCK_BITS
+        # The bitarray covers whole bytes, so it may be up to 7 bits
+        # longer than size.
+        bf.bitArr = bitarray(
+            buffer=memoryview(data)[_FILE_DATA_OFFSET:
+                                    _FILE_DATA_OFFSET + (size + 7)//8],
+            endian='big')
+        return bf
+
+    def union(self, other):
+        """Returns a filter holding the values of both this filter and
+        @other, as if they had all been inserted in one filter.
+
+        The filters must have been created with the same parameters. The
+        bit arrays are OR-ed word by word, so no value is re-inserted.
+        """
+        self._checkCompatible(other)
+        return self.__withBits(self.__bits() | other.__bits())
+
+    def intersection(self, other):
+        """Returns a filter reporting the values reported by both this
+        filter and @other.
+
+        Bits set by two different values, one in each filter, end up set
+        too, so the result may have more false positives than a filter in
+        which only the common values were inserted.
+        """
+        self._checkCompatible(other)
+        return self.__withBits(self.__bits() & other.__bits())
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __ior__(self, other):
+        self._checkCompatible(other)
+        if len(self.bitArr) == len(other.bitArr):
+            self.bitArr |= other.bitArr
+        else:
+            self.bitArr[:self.size] = self.__bits() | other.__bits()
+        return self
+
+    def estimate_num_values(self):
+        """Estimates how many distinct values were inserted from the
+        number of set bits X, as -size/numHashes * ln(1 - X/size)."""
+        ones = self.count(True)
+        if ones == self.size:
+            return float('inf')
+        return -self.size/self.numHashes*log(1 - ones/self.size)
+
+    def _checkCompatible(self, other):
+        if type(self) is not type(other) or \
+                type(self.hasher) is not type(other.hasher) or \
+                (self.size, self.numHashes, self.seed) != \
+                (other.size, other.numHashes, other.seed):
+            raise ValueError('filters have different parameters')
+
+    def __bits(self):
+        # A file backed bitarray may be longer than size, see open().
+        if len(self.bitArr) == self.size:
+            return self.bitArr
+        return self.bitArr[:self.size]
+
+    def __withBits(self, bitArr):
+        bf = type(self).__new__(type(self))
+        bf.__dict__.update(self.__dict__)
+        bf.bitArr = bitArr
+        return bf
+
+    def false_positive_rate(self, num_values):
+        """Expected probability that a value that was not inserted is
+        reported as present, after @num_values distinct insertions."""
+        return _falsePositiveRate(self.size, self.numHashes, num_values)
+
+    def _allocate(self, size):
+        bitArr = bitarray(size, endian='big')
+        bitArr.setall(False)
+        return bitArr
+
+    def _getHashes(self, value):
+        h64l, h64u = self.hasher.pair(value)
 
         hashes = map(
             lambda i: (h64l + i*h64u) % self.size,
@@ -55,5 +228,677 @@ class BloomFilter:
         )
         return hashes
 
+    def _getHashesMany(self, values):
+        """Same as _getHashes for a batch of values: returns a
+        len(values) x numHashes array of bit indexes."""
+        return self._hashesFromPairs(self.hasher.pairs(values))
+
+    def _hashesFromPairs(self, pairs):
+        return _doubleHashes(pairs, self.size, self.numHashes)
+
+    def __str__(self):
+        return self.bitArr[:self.size].to01()
+
+
+class BlockedBloomFilter(BloomFilter):
+    def __init__(self, size, num_values, num_hashes=None, seed=0,
+                 hasher=Murmur3Hasher):
+        """Bloom filter whose bit array is split in blocks of 512 bits, the
+        size of a cache line.
+
+        One hash picks the block of a value and all of its @num_hashes bits
+        are set within that block, so insert and query touch a single cache
+        line instead of @num_hashes random ones. The price is a somewhat
+        higher false positive rate for the same size, since blocks do not
+        fill up evenly (see false_positive_rate).
+
+        @size is rounded up to a multiple of the block size.
+        """
+        self.numBlocks = max(1, -(-size // BLOCK_BITS))
+        BloomFilter.__init__(
+            self, self.numBlocks*BLOCK_BITS, num_values, num_hashes, seed,
+            hasher)
+
+    def false_positive_rate(self, num_values):
+        """Expected false positive rate after @num_values insertions.
+
+        The number of values falling into a block is Poisson distributed
+        with mean num_values/numBlocks, and a block holding i values
+        behaves like a classic filter of BLOCK_BITS bits with i values.
+        """
+        k = self.numHashes
+        mean = num_values/self.numBlocks
+        rate = 0
+        for i in range(int(mean + 10*sqrt(mean)) + 10):
+            if mean > 0:
+                p = exp(i*log(mean) - mean - lgamma(i + 1))
+            else:
+                p = 1.0 if i == 0 else 0.0
+            rate += p*(1 - exp(-k*i/BLOCK_BITS))**k
+        return rate
+
+    def _allocate(self, size):
+        # Align the storage to a cache line so that no block straddles two
+        # of them.
+        storage = np.zeros(size//8 + BLOCK_BITS//8, dtype=np.uint8)
+        offset = -storage.ctypes.data % (BLOCK_BITS//8)
+        return bitarray(
+            buffer=storage[offset:offset + size//8], endian='big')
+
+    def _getHashes(self, value):
+        h64l, h64u = self.hasher.pair(value)
+
+        # The lower half picks the block and the upper one is split in
+        # two 32 bits hashes to pick the bits within it. The step is odd
+        # so the first 512 bits are distinct.
+        start = (h64l % self.numBlocks)*BLOCK_BITS
+        first = h64u & ((1 << 32) - 1)
+        step = (h64u >> 32) | 1
+
+        hashes = map(
+            lambda i: start + (first + i*step) % BLOCK_BITS,
+            range(self.numHashes)
+        )
+        return hashes
+
+    def _hashesFromPairs(self, pairs):
+        start = (pairs[:, 0] % np.uint64(self.numBlocks))*np.uint64(BLOCK_BITS)
+        first = pairs[:, 1] & np.uint64((1 << 32) - 1)
+        step = (pairs[:, 1] >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.numHashes, dtype=np.uint64)
+        offsets = (first[:, None] + i*step[:, None]) % np.uint64(BLOCK_BITS)
+        return start[:, None] + offsets
+
+
+class CountingBloomFilter:
+    def __init__(self, size, num_values, num_hashes=None, seed=0,
+                 hasher=Murmur3Hasher, counter_bits=4):
+        """Bloom filter that supports removals.
+
+        Each of the @size slots is a small counter instead of a bit:
+        inserting a value increments the counters at its hashes (the same
+        double hashing as BloomFilter) and removing it decrements them.
+        The counters are packed in a NumPy byte array and take
+        @counter_bits bits each, 4 or 8, so a slot costs half a byte or a
+        byte.
+
+        A counter that reaches its maximum (15 or 255) is saturated: it
+        may have been incremented more times than it can count, so it is
+        never decremented again. Values hashing to it can then no longer
+        be fully removed, but there are no false negatives.
+        """
+        if counter_bits not in (4, 8):
+            raise ValueError('counter_bits must be 4 or 8')
+        self.size = size
+        self.seed = seed
+        self.hasher = hasher(seed)
+        self.counterBits = counter_bits
+        self.maxCount = (1 << counter_bits) - 1
+        self.counters = np.zeros((size*counter_bits + 7)//8, dtype=np.uint8)
+
+        self.numHashes = _numHashes(size, num_values, num_hashes)
+
+    def insert(self, value):
+        self.insert_many([value])
+
+    def query(self, value):
+        return bool(self.query_many([value])[0])
+
+    def remove(self, value):
+        """Removes @value and returns True if it was (possibly) present,
+        otherwise leaves the filter untouched and returns False."""
+        return bool(self.remove_many([value])[0])
+
+    def insert_many(self, values):
+        slots, increments = np.unique(
+            self._getHashesMany(values), return_counts=True)
+        counts = self.__get(slots) + np.minimum(increments, self.maxCount)
+        self.__set(slots, np.minimum(counts, self.maxCount))
+
+    def query_many(self, values):
+        return (self.__get(self._getHashesMany(values)) > 0).all(axis=1)
+
+    def remove_many(self, values):
+        """Removes every value of @values that query() reports as present.
+        Returns a boolean NumPy array telling which ones were."""
+        hashes = self._getHashesMany(values)
+        present = (self.__get(hashes) > 0).all(axis=1)
+        slots, decrements = np.unique(hashes[present], return_counts=True)
+        counts = self.__get(slots).astype(np.int64)
+        saturated = counts == self.maxCount
+        counts = np.where(saturated, counts, np.maximum(counts - decrements, 0))
+        self.__set(slots, counts.astype(np.uint8))
+        return present
+
+    def count(self, boolean):
+        if self.counterBits == 8:
+            nonzero = np.count_nonzero(self.counters)
+        else:
+            nonzero = np.count_nonzero(self.counters & np.uint8(0xf)) + \
+                np.count_nonzero(self.counters >> np.uint8(4))
+        nonzero = int(nonzero)
+        return nonzero if boolean else self.size - nonzero
+
+    def false_positive_rate(self, num_values):
+        return _falsePositiveRate(self.size, self.numHashes, num_values)
+
+    def _getHashesMany(self, values):
+        return _doubleHashes(self.hasher.pairs(values), self.size,
+                             self.numHashes)
+
+    def __get(self, slots):
+        if self.counterBits == 8:
+            return self.counters[slots]
+        shifts = ((slots & 1)*4).astype(np.uint8)
+        return (self.counters[slots >> 1] >> shifts) & np.uint8(0xf)
+
+    def __set(self, slots, counts):
+        """Stores @counts at the distinct @slots."""
+        if self.counterBits == 8:
+            self.counters[slots] = counts
+            return
+        # Two slots share a byte, so the low and high halves are written
+        # separately to never assign the same byte twice at once.
+        for half in (0, 1):
+            selected = (slots & 1) == half
+            where = slots[selected] >> 1
+            kept = self.counters[where] & np.uint8(0xf0 >> 4*half)
+            self.counters[where] = kept | (
+                counts[selected].astype(np.uint8) << np.uint8(4*half))
+
+    def __str__(self):
+        return ' '.join(map(str, self.__get(np.arange(self.size))))
+
+
+class ScalableBloomFilter:
+    def __init__(self, error_rate, initial_capacity=1000, growth=2,
+                 tightening=0.5, hasher=Murmur3Hasher):
+        """Bloom filter that grows with the number of values inserted,
+        keeping the false positive probability below @error_rate.
+
+        It is a chain of classic filters. Once the last one holds as many
+        values as it was sized for, a new filter @growth times larger is
+        appended whose own error rate is @tightening times smaller. The
+        error rates form a geometric series starting at
+        @error_rate*(1 - @tightening), so their sum, which bounds the
+        overall false positive probability, never exceeds @error_rate.
+
+        See "Scalable Bloom Filters" by Almeida et al.
+        """
+        self.errorRate = error_rate
+        self.hasher = hasher
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+        # Number of values each filter is sized for, its error rate and
+        # the number of values inserted in it
+        self.capacities = []
+        self.errorRates = []
+        self.counts = []
+        self.__addFilter(initial_capacity, error_rate*(1 - tightening))
+
+    def insert(self, value):
+        if not self.query(value):
+            self.__reserve(1)
+            self.filters[-1].insert(value)
+            self.counts[-1] += 1
+
+    def query(self, value):
+        return any(bf.query(value) for bf in self.filters)
+
+    def insert_many(self, values):
+        # Values repeated in the batch or already present would count
+        # twice towards the capacity. The filters share their hash
+        # function, so the batch is hashed once, and values with the same
+        # hashes are the same to them.
+        pairs = self.__pairs(values)
+        _, first = np.unique(pairs, axis=0, return_index=True)
+        pairs = pairs[np.sort(first)]
+        pairs = pairs[~self.__queryPairs(pairs)]
+        while len(pairs):
+            room = self.__reserve(len(pairs))
+            bf = self.filters[-1]
+            bf._insertHashes(bf._hashesFromPairs(pairs[:room]))
+            self.counts[-1] += len(pairs[:room])
+            pairs = pairs[room:]
+
+    def query_many(self, values):
+        return self.__queryPairs(self.__pairs(values))
+
+    def __len__(self):
+        """Number of distinct values inserted, up to false positives."""
+        return sum(self.counts)
+
+    def false_positive_rate(self):
+        """Expected false positive probability given what was inserted."""
+        negative = 1.0
+        for bf, count in zip(self.filters, self.counts):
+            negative *= 1 - bf.false_positive_rate(count)
+        return 1 - negative
+
+    def memory_usage(self):
+        """Bytes taken by the bit arrays of the filters."""
+        return sum((bf.size + 7)//8 for bf in self.filters)
+
+    def count(self, boolean):
+        return sum(bf.count(boolean) for bf in self.filters)
+
+    def __pairs(self, values):
+        return self.filters[0].hasher.pairs(values)
+
+    def __queryPairs(self, pairs):
+        found = np.zeros(len(pairs), dtype=bool)
+        for bf in self.filters:
+            found |= bf._queryHashes(bf._hashesFromPairs(pairs))
+        return found
+
+    def __reserve(self, count):
+        """Makes room for values in the last filter, appending a new one
+        if it is full, and returns how many of @count values fit."""
+        if self.counts[-1] >= self.capacities[-1]:
+            self.__addFilter(self.capacities[-1]*self.growth,
+                             self.errorRates[-1]*self.tightening)
+        return min(count, self.capacities[-1] - self.counts[-1])
+
+    def __addFilter(self, capacity, error_rate):
+        # Optimal number of bits and of hash functions for the capacity
+        # and error rate. Double hashing gives a few percent more false
+        # positives than the formula assumes, so the bits are computed for
+        # a 10% lower rate. Below a few thousand bits the gap is much
+        # larger (up to 4 times), so small filters get SCALABLE_MIN_BITS.
+        size = max(SCALABLE_MIN_BITS,
+                   int(ceil(capacity*log(1/(0.9*error_rate))/log(2)**2)))
+        num_hashes = max(1, int(ceil(log(1/error_rate, 2))))
+        self.filters.append(
+            BloomFilter(size, capacity, num_hashes, hasher=self.hasher))
+        self.capacities.append(capacity)
+        self.errorRates.append(error_rate)
+        self.counts.append(0)
+
+
+class PartitionedBloomFilter:
+    def __init__(self, size, num_values, num_partitions, num_hashes=None,
+                 seed=0, hasher=Murmur3Hasher):
+        """Bloom filter split into @num_partitions independent classic
+        filters of about @size/@num_partitions bits each.
+
+        Every value goes to a single partition, picked from the top bits
+        of its hash, and is then hashed into that partition as usual.
+        Batches are split in chunks that are hashed and probed in
+        parallel, see query_many(). Since no value spans two partitions,
+        each one can also be saved and rebuilt on its own.
+        """
+        self.size = size
+        self.seed = seed
+        self.hasher = hasher(seed)
+        self.numPartitions = num_partitions
+        self.partitions = [
+            BloomFilter(int(ceil(size/num_partitions)),
+                        int(ceil(num_values/num_partitions)), num_hashes,
+                        seed, hasher)
+            for _ in range(num_partitions)
+        ]
+        self.numHashes = self.partitions[0].numHashes
+        # Directory the partitions are mapped from, see open().
+        self.directory = None
+        self.writable = True
+
+    def partition_of(self, value):
+        """Index of the partition @value belongs to."""
+        h64l, _ = self.hasher.pair(value)
+        return ((h64l >> 32)*self.numPartitions) >> 32
+
+    def insert(self, value):
+        self.__checkWritable()
+        self.partitions[self.partition_of(value)].insert(value)
+
+    def query(self, value):
+        return self.partitions[self.partition_of(value)].query(value)
+
+    def insert_many(self, values, executor=None):
+        """Inserts every value of the iterable @values, using @executor as
+        query_many() does.
+
+        The chunks are hashed in parallel first. Then each partition gets
+        the hashes of its values as one task, so that no two tasks ever
+        write to the same partition."""
+        self.__checkWritable()
+        executor, target = self.__target(executor)
+        byPartition = [[] for _ in range(self.numPartitions)]
+        for future in [executor.submit(_hashChunk, target, chunk)
+                       for chunk in self.__chunks(values)]:
+            for index, pairs in enumerate(future.result()):
+                byPartition[index].append(pairs)
+        for future in [executor.submit(_insertPartition, target, index,
+                                       np.concatenate(pairs))
+                       for index, pairs in enumerate(byPartition) if pairs]:
+            future.result()
+
+    def query_many(self, values, executor=None):
+        """Returns a boolean NumPy array telling, for each value of the
+        iterable @values, whether query(value) is true.
+
+        The batch is split in as many chunks as there are partitions, and
+        each chunk is hashed, routed and probed by one task. With no
+        @executor the tasks run here one after the other.
+
+        With a concurrent.futures.ThreadPoolExecutor they share the
+        partitions in memory. Threads only overlap where the GIL is
+        released: in NumPy, so mostly with FastHasher on arrays of ints.
+        A ProcessPoolExecutor avoids the GIL altogether, but the workers
+        need to find the partitions on disk, so the filter must come from
+        open(). Each worker maps the files once, and again when a
+        partition is rebuilt.
+        """
+        executor, target = self.__target(executor)
+        futures = [executor.submit(_queryChunk, target, chunk)
+                   for chunk in self.__chunks(values)]
+        results = [future.result() for future in futures]
+        if not results:
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(results)
+
+    def count(self, boolean):
+        return sum(bf.count(boolean) for bf in self.partitions)
+
+    def false_positive_rate(self, num_values):
+        """Expected false positive probability once @num_values distinct
+        values have been inserted, spread evenly over the partitions."""
+        share = num_values/self.numPartitions
+        return sum(bf.false_positive_rate(share)
+                   for bf in self.partitions)/self.numPartitions
+
+    def rebuild_partition(self, index, values):
+        """Empties partition @index and inserts the values of @values that
+        belong to it, ignoring the others. The other partitions are left
+        as they are."""
+        self.__checkWritable()
+        old = self.partitions[index]
+        bf = BloomFilter(old.size, 1, old.numHashes, self.seed,
+                         type(self.hasher))
+        pairs = self.hasher.pairs(values)
+        bf._insertHashes(
+            bf._hashesFromPairs(pairs[self._route(pairs) == index]))
+        self.partitions[index] = bf
+        if self.directory is not None:
+            self.save_partition(self.directory, index)
+            self.partitions[index] = BloomFilter.open(
+                self.__path(self.directory, index), self.writable)
+
+    def save(self, directory):
+        """Writes every partition to its own file in @directory, which
+        must exist, next to a manifest.json describing the filter."""
+        self.__checkWritable()
+        manifest = {
+            'size': self.size,
+            'num_partitions': self.numPartitions,
+            'num_hashes': self.numHashes,
+            'seed': self.seed,
+            'hasher': HASHERS.index(type(self.hasher)),
+        }
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        for index in range(self.numPartitions):
+            self.save_partition(directory, index)
+
+    def save_partition(self, directory, index):
+        """Writes only partition @index to @directory, e.g. after it was
+        rebuilt. Like BloomFilter.save(), it replaces the file, so worker
+        processes still mapping the previous one are not disturbed."""
+        self.__checkWritable()
+        self.partitions[index].save(self.__path(directory, index))
+
+    @classmethod
+    def open(cls, directory, writable=False):
+        """Opens a filter written by save(), memory mapping each
+        partition with BloomFilter.open()."""
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        bf = cls.__new__(cls)
+        bf.size = manifest['size']
+        bf.numPartitions = manifest['num_partitions']
+        bf.numHashes = manifest['num_hashes']
+        bf.seed = manifest['seed']
+        bf.hasher = HASHERS[manifest['hasher']](bf.seed)
+        bf.directory = directory
+        bf.writable = writable
+        bf.partitions = [
+            BloomFilter.open(cls.__path(directory, index), writable)
+            for index in range(bf.numPartitions)
+        ]
+        return bf
+
+    def _route(self, pairs):
+        # Same as partition_of() for the h64l column of @pairs.
+        high = pairs[:, 0] >> np.uint64(32)
+        return (high*np.uint64(self.numPartitions)) >> np.uint64(32)
+
+    def _hashChunk(self, values):
+        """Hashes @values and returns their hash pairs grouped by
+        partition."""
+        pairs = self.hasher.pairs(values)
+        routes = self._route(pairs)
+        return [pairs[routes == index] for index in range(self.numPartitions)]
+
+    def _queryChunk(self, values):
+        pairs = self.hasher.pairs(values)
+        routes = self._route(pairs)
+        found = np.zeros(len(pairs), dtype=bool)
+        for index, bf in enumerate(self.partitions):
+            rows = routes == index
+            found[rows] = bf._queryHashes(bf._hashesFromPairs(pairs[rows]))
+        return found
+
+    @staticmethod
+    def __path(directory, index):
+        return os.path.join(directory, 'partition-{:04d}.bloom'.format(index))
+
+    def __checkWritable(self):
+        if not self.writable:
+            raise ValueError('the filter was not opened writable')
+
+    def __chunks(self, values):
+        if not isinstance(values, np.ndarray):
+            values = list(values)
+        step = max(1, -(-len(values)//self.numPartitions))
+        return [values[start:start + step]
+                for start in range(0, len(values), step)]
+
+    def __target(self, executor):
+        """Returns the executor to use and what its tasks get to find the
+        filter: the filter itself, or for worker processes its directory,
+        writable flag and the inodes of the partition files, which change
+        when a partition is rebuilt."""
+        if executor is None:
+            return _InlineExecutor(), self
+        if not isinstance(executor, ProcessPoolExecutor):
+            return executor, self
+        if self.directory is None:
+            raise ValueError('a process pool needs a filter from open()')
+        inodes = tuple(os.stat(self.__path(self.directory, index)).st_ino
+                       for index in range(self.numPartitions))
+        return executor, (self.directory, self.writable, inodes)
+
+
+class SharedBloomFilter:
+    def __init__(self, size, num_values, num_hashes=None, seed=0,
+                 hasher=Murmur3Hasher, name=None):
+        """Bloom filter living in shared memory, so that several processes
+        can insert and query it concurrently. Other processes use attach()
+        with its @name to open it.
+
+        No locks are needed because bits are only ever set. Setting a bit
+        within a byte is a read-modify-write, though, and two processes
+        setting different bits of the same byte could lose one of them.
+        So each bit takes a whole byte here and inserting only stores ones,
+        which never conflicts. That makes the filter 8 times larger than a
+        BloomFilter of the same @size.
+        """
+        self.size = size
+        self.seed = seed
+        self.hasher = hasher(seed)
+        self.numHashes = _numHashes(size, num_values, num_hashes)
+
+        self.sharedMemory = shared_memory.SharedMemory(
+            name=name, create=True, size=_SHARED_DATA_OFFSET + size)
+        _SHARED_HEADER.pack_into(
+            self.sharedMemory.buf, 0, _SHARED_MAGIC, size, self.numHashes,
+            seed, HASHERS.index(hasher))
+        self.__map()
+
+    @classmethod
+    def attach(cls, name):
+        """Opens the shared filter called @name created by another
+        process."""
+        bf = cls.__new__(cls)
+        # Before Python 3.13 attaching registers the segment with the
+        # resource tracker of this process, which destroys it when the
+        # process exits. Only the creator should own it, see unlink().
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        magic, bf.size, bf.numHashes, bf.seed, hasher = \
+            _SHARED_HEADER.unpack_from(shm.buf)
+        if magic != _SHARED_MAGIC:
+            shm.close()
+            raise ValueError('{} is not a shared bloom filter'.format(name))
+        bf.hasher = HASHERS[hasher](bf.seed)
+        bf.sharedMemory = shm
+        bf.__map()
+        return bf
+
+    @property
+    def name(self):
+        return self.sharedMemory.name
+
+    def close(self):
+        """Detaches this process from the filter."""
+        self.bytes = None
+        self.sharedMemory.close()
+
+    def unlink(self):
+        """Destroys the filter once every process has closed it."""
+        if sys.version_info < (3, 13):
+            # A multiprocessing child shares the tracker of its parent, so
+            # its attach() may have unregistered the segment there, and
+            # unlinking unregisters it again.
+            resource_tracker.register(self.sharedMemory._name,
+                                      'shared_memory')
+        self.sharedMemory.unlink()
+
+    def insert(self, value):
+        self.insert_many([value])
+
+    def query(self, value):
+        return bool(self.query_many([value])[0])
+
+    def insert_many(self, values):
+        self.bytes[self._getHashesMany(values)] = 1
+
+    def query_many(self, values):
+        return self.bytes[self._getHashesMany(values)].all(axis=1)
+
+    def count(self, boolean):
+        nonzero = int(np.count_nonzero(self.bytes))
+        return nonzero if boolean else self.size - nonzero
+
+    def false_positive_rate(self, num_values):
+        return _falsePositiveRate(self.size, self.numHashes, num_values)
+
+    def _getHashesMany(self, values):
+        return _doubleHashes(self.hasher.pairs(values), self.size,
+                             self.numHashes)
+
+    def __map(self):
+        self.bytes = np.ndarray((self.size,), dtype=np.uint8,
+                                buffer=self.sharedMemory.buf,
+                                offset=_SHARED_DATA_OFFSET)
+
     def __str__(self):
-        return self.bitArr.to01()
+        return ''.join(map(str, self.bytes))
+
+
+# Classes that can be stored in a file, indexed by the layout number
+# recorded in its header.
+_LAYOUTS = [BloomFilter, BlockedBloomFilter]
+
+# Header of the files written by save(): magic, version, layout, size,
+# numHashes, seed and hasher (its index in HASHERS). The bits start at
+# _FILE_DATA_OFFSET, which keeps the blocks of BlockedBloomFilter aligned
+# to cache lines. Version 1 had no hasher, but zero padding in its place,
+# which reads as Murmur3Hasher.
+_FILE_HEADER = struct.Struct('<8sIIQIII')
+_FILE_MAGIC = b'BLOOMFLT'
+_FILE_VERSION = 2
+_FILE_DATA_OFFSET = 64
+
+# Header of the shared memory of SharedBloomFilter: magic, size,
+# numHashes, seed and hasher.
+_SHARED_HEADER = struct.Struct('<8sQIII')
+_SHARED_MAGIC = b'BLOOMSHM'
+_SHARED_DATA_OFFSET = 64
+
+# PartitionedBloomFilters opened by this process, when it is a worker of
+# a ProcessPoolExecutor, with the inodes of their partition files.
+_openPartitioned = {}
+
+
+def _numHashes(size, num_values, num_hashes):
+    # Number of hash functions that minimizes the probability of false
+    # positives, unless given.
+    if num_hashes is None:
+        return max(5, int(log(2)*size/num_values))
+    return num_hashes
+
+
+def _doubleHashes(pairs, size, num_hashes):
+    """The @num_hashes indexes below @size of each row (h64l, h64u) of
+    @pairs: (h64l + i*h64u) % size, computed incrementally so that the
+    intermediate values fit in 64 bits."""
+    size = np.uint64(size)
+    step = pairs[:, 1] % size
+    hashes = np.empty((len(pairs), num_hashes), dtype=np.uint64)
+    hashes[:, 0] = pairs[:, 0] % size
+    for i in range(1, num_hashes):
+        hashes[:, i] = (hashes[:, i - 1] + step) % size
+    return hashes
+
+
+def _falsePositiveRate(size, num_hashes, num_values):
+    return (1 - exp(-num_hashes*num_values/size))**num_hashes
+
+
+def _resolve(target):
+    """The PartitionedBloomFilter a task works on. In a worker process
+    @target describes it, and it is opened once per version."""
+    if isinstance(target, PartitionedBloomFilter):
+        return target
+    directory, writable, inodes = target
+    cached = _openPartitioned.get((directory, writable))
+    if cached is None or cached[0] != inodes:
+        cached = (inodes, PartitionedBloomFilter.open(directory, writable))
+        _openPartitioned[(directory, writable)] = cached
+    return cached[1]
+
+
+def _hashChunk(target, values):
+    return _resolve(target)._hashChunk(values)
+
+
+def _queryChunk(target, values):
+    return _resolve(target)._queryChunk(values)
+
+
+def _insertPartition(target, index, pairs):
+    bf = _resolve(target).partitions[index]
+    bf._insertHashes(bf._hashesFromPairs(pairs))
+
+
+class _InlineExecutor:
+    """Runs the tasks of PartitionedBloomFilter as they are submitted."""
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
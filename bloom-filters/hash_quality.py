@@ -0,0 +1,116 @@
+"""Checks how uniformly the hashers of hashers.py spread their values,
+like hash_experiments.py does for murmur3, so a hasher can be validated
+before a filter is switched to it.
+
+For every hasher and kind of key it prints CSV rows with:
+
+- buckets: chi-square statistic, divided by its degrees of freedom, of
+  the counts of the double hashes (h64l + j*h64u) % N over N buckets,
+  for each of the first 5 j. It is about 1 for uniform hashes;
+- bit_bias: largest deviation from 1/2 of the frequency of a one, over
+  the 128 bits of (h64l, h64u);
+- avalanche: average fraction of the 128 bits that change when one bit
+  of the key changes, which should be close to 1/2;
+
+and whether the value is within the range expected for a random hash.
+
+    python hash_quality.py > quality.csv
+"""
+from math import sqrt
+import random
+import sys
+
+import numpy as np
+
+from hashers import FastHasher, Murmur3Hasher, XXHasher, xxhash
+
+N = 1000
+NUM_KEYS = 100000
+NUM_HASHES = 5
+
+
+def keys(kind, n):
+    rng = random.Random(0)
+    if kind == 'sequential ints':
+        return list(range(n))
+    if kind == 'random ints':
+        return [rng.getrandbits(64) for _ in range(n)]
+    if kind == 'strings':
+        return [str(i) for i in range(n)]
+    if kind == 'bytes':
+        return [i.to_bytes(8, 'little') for i in range(n)]
+    raise ValueError(kind)
+
+
+def flip(key, bit):
+    """Returns @key with its @bit-th bit flipped."""
+    if isinstance(key, int):
+        return key ^ (1 << bit)
+    if isinstance(key, str):
+        return flip(key.encode('utf-8'), bit).decode('latin-1')
+    key = bytearray(key)
+    key[bit // 8 % len(key)] ^= 1 << (bit % 8)
+    return bytes(key)
+
+
+def bucket_chi2(pairs):
+    """chi-square/df of each of the NUM_HASHES double hashes."""
+    size = np.uint64(N)
+    expected = len(pairs) / N
+    result = []
+    h = pairs[:, 0] % size
+    step = pairs[:, 1] % size
+    for _ in range(NUM_HASHES):
+        counts = np.bincount(h.astype(np.int64), minlength=N)
+        result.append(((counts - expected)**2 / expected).sum() / (N - 1))
+        h = (h + step) % size
+    return result
+
+
+def bits(pairs):
+    """len(pairs) x 128 array of the bits of the pairs."""
+    as_bytes = pairs.astype('<u8').view(np.uint8).reshape(len(pairs), 16)
+    return np.unpackbits(as_bytes, axis=1)
+
+
+def bit_bias(pairs):
+    return float(np.abs(bits(pairs).mean(axis=0) - 0.5).max())
+
+
+def avalanche(hasher, sample):
+    changed = []
+    for bit in range(16):
+        flipped = [flip(key, bit) for key in sample]
+        diff = bits(hasher.pairs(sample)) != bits(hasher.pairs(flipped))
+        changed.append(diff.mean())
+    return float(np.mean(changed))
+
+
+def main():
+    hashers = [Murmur3Hasher, FastHasher]
+    if xxhash is not None:
+        hashers.append(XXHasher)
+    # A random hash is within these bounds with high probability.
+    chi2_bound = 4*sqrt(2.0 / (N - 1))
+    bias_bound = 4*0.5/sqrt(NUM_KEYS)
+    print('hasher, keys, test, value, ok')
+    for hasher_class in hashers:
+        hasher = hasher_class()
+        for kind in ['sequential ints', 'random ints', 'strings', 'bytes']:
+            sample = keys(kind, NUM_KEYS)
+            pairs = hasher.pairs(sample)
+            for j, chi2 in enumerate(bucket_chi2(pairs)):
+                print('{}, {}, buckets h{}, {:.4f}, {}'.format(
+                    hasher_class.__name__, kind, j, chi2,
+                    abs(chi2 - 1) < chi2_bound))
+            bias = bit_bias(pairs)
+            print('{}, {}, bit_bias, {:.4f}, {}'.format(
+                hasher_class.__name__, kind, bias, bias < bias_bound))
+            change = avalanche(hasher, sample[:2000])
+            print('{}, {}, avalanche, {:.4f}, {}'.format(
+                hasher_class.__name__, kind, change, abs(change - 0.5) < 0.01))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# pip install mmh3
+# pip install numpy
+# pip install xxhash (optional, for XXHasher)
+"""Hash functions for the Bloom filters.
+
+A hasher turns a value into two 64 bits hashes (h64l, h64u), from which
+the filters derive their numHashes indexes by double hashing. pair()
+hashes a single value and pairs() a batch, returning a len(values) x 2
+uint64 NumPy array. Both must agree.
+"""
+from mmh3 import hash64, hash128, mmh3_x64_128_utupledigest
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+MASK64 = (1 << 64) - 1
+
+# Constants of the splitmix64 generator.
+GOLDEN_GAMMA = 0x9e3779b97f4a7c15
+MIX1 = 0xbf58476d1ce4e5b9
+MIX2 = 0x94d049bb133111eb
+
+
+class Murmur3Hasher:
+    """Murmur3 128 bits hash of str(value). It is what BloomFilter has
+    always used, so it is the default, but every value pays for the
+    conversion to a string."""
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def pair(self, value):
+        h128 = hash128(str(value), self.seed)
+        return h128 & MASK64, h128 >> 64
+
+    def pairs(self, values):
+        return np.array(
+            [hash64(str(value), self.seed, signed=False) for value in values],
+            dtype=np.uint64
+        ).reshape(-1, 2)
+
+
+class FastHasher:
+    """Hashes values according to their type, without calling str():
+
+    - bytes, bytearray and memoryview are hashed in place with murmur3;
+    - str is hashed as UTF-8 with murmur3 (same as its encoded bytes);
+    - int is mixed with splitmix64, taken modulo 2**64. For a batch of
+      ints the mixing is vectorized with NumPy;
+    - anything else falls back to str().
+    """
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def pair(self, value):
+        if isinstance(value, (int, np.integer)):
+            return _mixInt(int(value), self.seed)
+        if isinstance(value, str):
+            return hash64(value, self.seed, signed=False)
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return mmh3_x64_128_utupledigest(value, self.seed)
+        return hash64(str(value), self.seed, signed=False)
+
+    def pairs(self, values):
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'iu':
+            return _mixInts(values, self.seed)
+        values = list(values)
+        if values and all(type(value) is int for value in values):
+            ints = np.array(values)
+            # Ints that do not fit in 64 bits end up as Python objects.
+            if ints.dtype.kind in 'iu':
+                return _mixInts(ints, self.seed)
+        return np.array([self.pair(value) for value in values],
+                        dtype=np.uint64).reshape(-1, 2)
+
+
+class XXHasher(FastHasher):
+    """Like FastHasher, but hashes bytes and strings with the 128 bits
+    xxh3, which is faster than murmur3 on long keys. Needs the xxhash
+    package."""
+    def __init__(self, seed=0):
+        if xxhash is None:
+            raise ImportError('XXHasher needs the xxhash package')
+        FastHasher.__init__(self, seed)
+
+    def pair(self, value):
+        if isinstance(value, (int, np.integer)):
+            return _mixInt(int(value), self.seed)
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        elif not isinstance(value, (bytes, bytearray, memoryview)):
+            value = str(value).encode('utf-8')
+        h128 = xxhash.xxh3_128_intdigest(value, self.seed)
+        return h128 & MASK64, h128 >> 64
+
+
+# Hashers that filters saved to files can use, indexed by the number
+# recorded in the file header.
+HASHERS = [Murmur3Hasher, FastHasher, XXHasher]
+
+
+def _mix(z):
+    z = ((z ^ (z >> 30))*MIX1) & MASK64
+    z = ((z ^ (z >> 27))*MIX2) & MASK64
+    return z ^ (z >> 31)
+
+
+def _mixInt(value, seed):
+    # The two first outputs of a splitmix64 generator whose state is the
+    # value, offset by the seed.
+    z = (value + seed*GOLDEN_GAMMA) & MASK64
+    return (_mix((z + GOLDEN_GAMMA) & MASK64),
+            _mix((z + 2*GOLDEN_GAMMA) & MASK64))
+
+
+def _mixInts(values, seed):
+    # Same as _mixInt, with uint64 arithmetic wrapping around modulo 2**64.
+    z = values.astype(np.uint64) + np.uint64((seed*GOLDEN_GAMMA) & MASK64)
+    pairs = np.empty((len(values), 2), dtype=np.uint64)
+    for i in range(2):
+        x = z + np.uint64(((i + 1)*GOLDEN_GAMMA) & MASK64)
+        x = (x ^ (x >> np.uint64(30)))*np.uint64(MIX1)
+        x = (x ^ (x >> np.uint64(27)))*np.uint64(MIX2)
+        pairs[:, i] = x ^ (x >> np.uint64(31))
+    return pairs
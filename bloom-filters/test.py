@@ -1,5 +1,24 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from math import sqrt
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
-from bloom import BloomFilter
+
+import numpy as np
+from bloom import (BloomFilter, BlockedBloomFilter, CountingBloomFilter,
+                   PartitionedBloomFilter, ScalableBloomFilter,
+                   SharedBloomFilter)
+from hashers import FastHasher
+
+def insertIntoSharedFilter(name, values):
+    bf = SharedBloomFilter.attach(name)
+    for value in values:
+        bf.insert(value)
+    bf.close()
+
 
 class TestBloomFilter(unittest.TestCase):
 
@@ -47,6 +66,262 @@ class TestBloomFilter(unittest.TestCase):
         # there must be false positives.
         self.assertTrue(fp_cnt > 0)
 
+    def testBatchOperationsMatchSingleOperations(self):
+        n = 100
+        bf = BloomFilter(300, n)
+        batch = BloomFilter(300, n)
+        for i in range(n):
+            bf.insert(str(i))
+        batch.insert_many(str(i) for i in range(n))
+        self.assertEqual(str(bf), str(batch))
+        probes = list(range(2 * n))
+        self.assertEqual([bf.query(j) for j in probes],
+                         list(batch.query_many(probes)))
+
+    def testBlockedFilterProbesASingleBlock(self):
+        n = 1000
+        bf = BlockedBloomFilter(10*n, n)
+        self.assertEqual(0, bf.size % 512)
+        for i in range(n):
+            hashes = list(bf._getHashes(i))
+            self.assertEqual(1, len(set(h // 512 for h in hashes)))
+        bf.insert_many(range(n))
+        self.assertTrue(bf.query_many(range(n)).all())
+        self.assertTrue(all(bf.query(i) for i in range(n)))
+
+    def testBlockedFalsePositiveRateEstimate(self):
+        n = 20000
+        bf = BlockedBloomFilter(8*n, n, 5)
+        bf.insert_many(range(n))
+        measured = bf.query_many(range(n, 11*n)).mean()
+        expected = bf.false_positive_rate(n)
+        classic = BloomFilter(bf.size, n, 5)
+        self.assertTrue(expected > classic.false_positive_rate(n))
+        self.assertAlmostEqual(expected, measured, delta=expected/4)
+
+    def testSaveAndOpen(self):
+        n = 100
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'filter')
+            for bf in [BloomFilter(3*n + 1, n, seed=7),
+                       BlockedBloomFilter(10*n, n)]:
+                bf.insert_many(range(n))
+                bf.save(path)
+                opened = BloomFilter.open(path)
+                self.assertEqual(type(bf), type(opened))
+                self.assertEqual(bf.count(True), opened.count(True))
+                self.assertEqual(bf.count(False), opened.count(False))
+                self.assertEqual(list(bf.query_many(range(3*n))),
+                                 list(opened.query_many(range(3*n))))
+                self.assertRaises(TypeError, opened.insert, n)
+                self.assertRaises(TypeError, opened.insert_many, [n])
+
+                writable = BloomFilter.open(path, writable=True)
+                writable.insert(n)
+                self.assertTrue(BloomFilter.open(path).query(n))
+
+    def testCountingFilterRemoval(self):
+        n = 200
+        for bits in (4, 8):
+            bf = CountingBloomFilter(10*n, n, counter_bits=bits)
+            bf.insert_many(range(n))
+            self.assertTrue(bf.query_many(range(n)).all())
+            self.assertTrue(bf.remove_many(range(0, n, 2)).all())
+            # No false negatives for the values left.
+            self.assertTrue(bf.query_many(range(1, n, 2)).all())
+            for i in range(1, n, 2):
+                self.assertTrue(bf.remove(i))
+            self.assertEqual(0, bf.count(True))
+            self.assertFalse(bf.remove(0))
+
+    def testCountingFilterSaturation(self):
+        bf = CountingBloomFilter(100, 1, 3, counter_bits=4)
+        for _ in range(20):
+            bf.insert('x')
+        self.assertEqual(set([0, 15]), set(int(c) for c in str(bf).split()))
+        for _ in range(20):
+            self.assertTrue(bf.remove('x'))
+        self.assertTrue(bf.query('x'))
+
+    def testScalableFilterKeepsErrorRate(self):
+        n = 20000
+        bf = ScalableBloomFilter(0.01, initial_capacity=100)
+        bf.insert_many(range(n // 2))
+        for i in range(n // 2, n):
+            bf.insert(i)
+        self.assertTrue(len(bf.filters) > 1)
+        self.assertTrue(bf.query_many(range(n)).all())
+        self.assertTrue(bf.false_positive_rate() <= 0.01)
+        # Within 3 standard deviations of the bound.
+        probes = 5*n
+        measured = bf.query_many(range(n, n + probes)).mean()
+        self.assertLessEqual(measured, 0.01 + 3*sqrt(0.01*0.99/probes))
+        for capacity in (6, 1000):
+            bf = ScalableBloomFilter(0.01, initial_capacity=capacity)
+            bf.insert_many(range(n))
+            measured = bf.query_many(range(n, n + probes)).mean()
+            self.assertLessEqual(measured, 0.01 + 3*sqrt(0.01*0.99/probes))
+        self.assertEqual(sum((f.size + 7)//8 for f in bf.filters),
+                         bf.memory_usage())
+
+    def testScalableFilterCountsDistinctValues(self):
+        bf = ScalableBloomFilter(0.01, initial_capacity=10)
+        bf.insert_many([1]*50 + [2, 2])
+        bf.insert_many([2, 3])
+        self.assertEqual(3, len(bf))
+        self.assertEqual(1, len(bf.filters))
+        self.assertTrue(bf.query_many([1, 2, 3]).all())
+        bf.insert_many([])
+        self.assertEqual(3, len(bf))
+
+    def testSharedFilterAcrossProcesses(self):
+        n = 2000
+        bf = SharedBloomFilter(10*n, n)
+        try:
+            workers = [
+                multiprocessing.Process(target=insertIntoSharedFilter,
+                                        args=(bf.name, range(i, n, 4)))
+                for i in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertTrue(bf.query_many(range(n)).all())
+            attached = SharedBloomFilter.attach(bf.name)
+            self.assertTrue(all(attached.query(i) for i in range(n)))
+            self.assertEqual(bf.count(True), attached.count(True))
+            attached.close()
+        finally:
+            bf.close()
+            bf.unlink()
+
+    def testSharedFilterAttachedByAnotherProgram(self):
+        n = 1000
+        bf = SharedBloomFilter(10*n, n)
+        try:
+            # The program waits for its resource tracker to exit, which is
+            # when the tracker destroys the segments the program leaked.
+            script = ('from multiprocessing import resource_tracker\n'
+                      'from bloom import SharedBloomFilter\n'
+                      'bf = SharedBloomFilter.attach({!r})\n'
+                      'bf.insert_many(range({}))\n'
+                      'bf.close()\n'
+                      'resource_tracker._resource_tracker._stop()\n'
+                      ).format(bf.name, n)
+            subprocess.check_call(
+                [sys.executable, '-c', script],
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+            # The segment outlives the program that attached to it
+            attached = SharedBloomFilter.attach(bf.name)
+            self.assertTrue(attached.query_many(range(n)).all())
+            attached.close()
+        finally:
+            bf.close()
+            bf.unlink()
+
+    def testUnionAndIntersection(self):
+        n = 1000
+        a = BloomFilter(10*n, n)
+        b = BloomFilter(10*n, n)
+        both = BloomFilter(10*n, n)
+        a.insert_many(range(0, n))
+        b.insert_many(range(n // 2, 2*n))
+        both.insert_many(range(0, 2*n))
+        self.assertEqual(str(both), str(a | b))
+        common = a & b
+        self.assertTrue(common.query_many(range(n // 2, n)).all())
+        a |= b
+        self.assertEqual(str(both), str(a))
+        self.assertRaises(ValueError, a.union, BloomFilter(10*n, n, seed=1))
+        self.assertRaises(ValueError, a.union, BlockedBloomFilter(10*n, n))
+
+    def testEstimateNumValues(self):
+        n = 5000
+        bf = BloomFilter(20*n, n)
+        bf.insert_many(range(n))
+        self.assertAlmostEqual(n, bf.estimate_num_values(), delta=n*0.05)
+
+    def testFastHasher(self):
+        n = 500
+        keys = [b'k%d' % i for i in range(n)] + list(range(n)) + \
+            [memoryview(b'view')]
+        bf = BloomFilter(20*n, 2*n, hasher=FastHasher)
+        bf.insert_many(keys)
+        self.assertTrue(all(bf.query(key) for key in keys))
+        self.assertTrue(bf.query_many(np.arange(n)).all())
+        single = BloomFilter(20*n, 2*n, hasher=FastHasher)
+        for key in keys:
+            single.insert(key)
+        self.assertEqual(str(single), str(bf))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'filter')
+            bf.save(path)
+            opened = BloomFilter.open(path)
+            self.assertIsInstance(opened.hasher, FastHasher)
+            self.assertTrue(opened.query_many(keys).all())
+
+    def testSaveOverOpenedFile(self):
+        n = 1000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'filter')
+            for layout in (BloomFilter, BlockedBloomFilter):
+                bf = layout(10*n, n)
+                bf.insert_many(range(n))
+                bf.save(path)
+                opened = layout.open(path, writable=True)
+                opened.insert_many(range(n, 2*n))
+                opened.save(path)
+                reopened = layout.open(path)
+                self.assertTrue(reopened.query_many(range(2*n)).all())
+                self.assertEqual(opened.count(True), reopened.count(True))
+                self.assertEqual(['filter'], os.listdir(directory))
+
+    def testPartitionedFilter(self):
+        n = 5000
+        bf = PartitionedBloomFilter(10*n, n, 4)
+        bf.insert_many([])
+        self.assertEqual(0, len(bf.query_many([])))
+        with ThreadPoolExecutor(4) as executor:
+            bf.insert_many([], executor)
+            bf.insert_many(range(n), executor)
+            self.assertTrue(bf.query_many(range(n), executor).all())
+            probes = bf.query_many(range(n, 2*n), executor)
+        self.assertTrue(all(bf.query(i) for i in range(n)))
+        self.assertEqual(list(probes), [bf.query(i) for i in range(n, 2*n)])
+        self.assertLess(probes.mean(), 2*bf.false_positive_rate(n))
+
+        with tempfile.TemporaryDirectory() as directory:
+            bf.save(directory)
+            opened = PartitionedBloomFilter.open(directory, writable=True)
+            with ProcessPoolExecutor(2) as executor:
+                self.assertEqual(
+                    list(opened.query_many(range(2*n), executor)),
+                    list(bf.query_many(range(2*n))))
+                opened.insert_many(range(2*n, 3*n), executor)
+                self.assertTrue(opened.query_many(range(2*n, 3*n)).all())
+
+            # Rebuilding a partition only drops what was inserted in it,
+            # also for workers that had mapped the previous version.
+            rebuilt = PartitionedBloomFilter.open(directory)
+            with ProcessPoolExecutor(2) as executor:
+                rebuilt.query_many(range(n), executor)
+                opened.rebuild_partition(0, range(n))
+                self.assertTrue(rebuilt.query_many(range(n), executor).all())
+                kept = rebuilt.query_many(range(2*n, 3*n), executor)
+            self.assertTrue(all(kept[i - 2*n] for i in range(2*n, 3*n)
+                                if rebuilt.partition_of(i) != 0))
+            self.assertLess(kept.mean(), 0.9)
+            self.assertEqual(list(kept),
+                             list(opened.query_many(range(2*n, 3*n))))
+
+            self.assertRaises(ValueError, rebuilt.insert, 1)
+            self.assertRaises(ValueError, rebuilt.insert_many, [1])
+            self.assertRaises(ValueError, rebuilt.rebuild_partition, 0, [1])
+            self.assertRaises(ValueError, rebuilt.save_partition,
+                              directory, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+"""Throughput of ConcurrentSkipList against a SkipList behind one global
+lock, for several threads doing a mix of contains (readers) and of
+insert/remove (writers).
+
+    python concurrentBenchmark.py --threads 1 4 8 --reads 0.5 0.9 0.99
+"""
+from __future__ import print_function
+import argparse
+from random import Random
+import threading
+import time
+
+from concurrentSkipList import ConcurrentSkipList
+from skipList import SkipList
+
+class LockedSkipList:
+    """A SkipList whose every operation takes the same lock."""
+
+    def __init__(self):
+        self.sl = SkipList()
+        self.lock = threading.Lock()
+
+    def insert(self, elem):
+        with self.lock:
+            self.sl.insert(elem)
+
+    def remove(self, elem):
+        with self.lock:
+            self.sl.remove(elem)
+
+    def contains(self, elem):
+        with self.lock:
+            return self.sl.contains(elem)
+
+STRUCTURES = {
+    'locked': LockedSkipList,
+    'concurrent': ConcurrentSkipList,
+}
+
+def worker(structure, reads, keys, operations, seed):
+    rng = Random(seed)
+    for _ in range(operations):
+        elem = rng.randrange(keys)
+        if rng.random() < reads:
+            structure.contains(elem)
+        elif rng.random() < 0.5:
+            structure.insert(elem)
+        else:
+            structure.remove(elem)
+
+def measure(name, threads, reads, keys, operations):
+    structure = STRUCTURES[name]()
+    # Half of the keys are present to begin with
+    for elem in Random(0).sample(range(keys), keys // 2):
+        structure.insert(elem)
+    workers = [
+        threading.Thread(target=worker,
+                         args=(structure, reads, keys, operations, i))
+        for i in range(threads)
+    ]
+    start = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads*operations/(time.time() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--reads', type=float, nargs='+',
+                        default=[0.5, 0.9, 0.99],
+                        help='fractions of the operations that are reads')
+    parser.add_argument('--keys', type=int, default=100000)
+    parser.add_argument('--operations', type=int, default=20000,
+                        help='operations per thread')
+    args = parser.parse_args()
+
+    print('%-10s %7s %6s %12s' % ('structure', 'threads', 'reads', 'ops/s'))
+    for reads in args.reads:
+        for threads in args.threads:
+            for name in sorted(STRUCTURES):
+                throughput = measure(name, threads, reads, args.keys,
+                                     args.operations)
+                print('%-10s %7d %6.2f %12.0f' % (name, threads, reads,
+                                                  throughput))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from random import getrandbits
+from threading import Lock
+import time
+
+# Nodes are never taller than this
+MAX_HEIGHT = 32
+
+class ConcurrentSkipNode(object):
+    """A node from a concurrent skip list.
+
+    marked is set when the node is being removed, and fullyLinked once it
+    has been linked at all its levels. Until then readers consider the
+    element absent."""
+    __slots__ = ('elem', 'next', 'lock', 'marked', 'fullyLinked')
+
+    def __init__(self, height, elem = None):
+        self.elem = elem
+        self.next = [None]*height
+        self.lock = Lock()
+        self.marked = False
+        self.fullyLinked = False
+
+class ConcurrentSkipList:
+    """Skip list that several threads can use at the same time.
+
+    It is the lazy skip list of Herlihy, Lev, Luchangco and Shavit, "A
+    Simple Optimistic Skiplist Algorithm":
+
+    - contains, find and iteration take no lock at all;
+    - insert and remove search without locks, then lock only the
+      predecessors found at each level (update in SkipList), check that
+      they are still linked to the same successors, and retry otherwise;
+    - remove first marks the node, which removes it logically, and then
+      unlinks it.
+
+    It relies on a store to a list item or an attribute being atomic, so
+    that a reader sees either the old or the new pointer. That is the case
+    with CPython, GIL or not.
+    """
+
+    def __init__(self):
+        self.head = ConcurrentSkipNode(MAX_HEIGHT)
+        self.head.fullyLinked = True
+        self.len = 0
+        # Levels in use. It only grows, so readers may use a stale value.
+        self.maxHeight = 0
+        # Guards len and the growth of maxHeight
+        self.sizeLock = Lock()
+
+    def __len__(self):
+        return self.len
+
+    def randomHeight(self):
+        bits = getrandbits(MAX_HEIGHT - 1)
+        height = 1
+        while bits & 1:
+            height += 1
+            bits >>= 1
+        return height
+
+    def findNode(self, elem, preds, succs):
+        """Fills preds[i] with the last node < elem on level i and succs[i]
+        with the node after it. Returns the highest level where elem was
+        found, or -1."""
+        found = -1
+        x = self.head
+        for i in reversed(range(self.maxHeight)):
+            y = x.next[i]
+            while y != None and y.elem < elem:
+                x = y
+                y = x.next[i]
+            if found == -1 and y != None and y.elem == elem:
+                found = i
+            preds[i] = x
+            succs[i] = y
+        return found
+
+    def find(self, elem):
+        x = self.head
+        for i in reversed(range(self.maxHeight)):
+            y = x.next[i]
+            while y != None and y.elem < elem:
+                x = y
+                y = x.next[i]
+            if y != None and y.elem == elem:
+                if y.fullyLinked and not y.marked:
+                    return y
+                return None
+        return None
+
+    def contains(self, elem):
+        return self.find(elem) != None
+
+    def __iter__(self):
+        """Yields the elements in increasing order. Elements inserted or
+        removed during the iteration may or may not be seen."""
+        x = self.head.next[0]
+        while x != None:
+            if x.fullyLinked and not x.marked:
+                yield x.elem
+            x = x.next[0]
+
+    def insert(self, elem):
+        """Inserts elem and returns True, or returns False if it was
+        already there."""
+        height = self.randomHeight()
+        if height > self.maxHeight:
+            with self.sizeLock:
+                self.maxHeight = max(self.maxHeight, height)
+        preds = [None]*MAX_HEIGHT
+        succs = [None]*MAX_HEIGHT
+        while True:
+            found = self.findNode(elem, preds, succs)
+            if found != -1:
+                node = succs[found]
+                if not node.marked:
+                    # Being inserted by another thread, wait for it so
+                    # that contains agrees once this returns
+                    while not node.fullyLinked:
+                        time.sleep(0)
+                    return False
+                # Being removed, try again once it is gone
+                time.sleep(0)
+                continue
+
+            locked = self.lockPredecessors(preds, succs, height)
+            try:
+                if locked == None:
+                    continue
+                node = ConcurrentSkipNode(height, elem)
+                for i in range(height):
+                    node.next[i] = succs[i]
+                # The node is only reachable once the loop below links it
+                for i in range(height):
+                    preds[i].next[i] = node
+                node.fullyLinked = True
+            finally:
+                self.unlock(locked)
+            with self.sizeLock:
+                self.len += 1
+            return True
+
+    def remove(self, elem):
+        """Removes elem and returns True, or returns False if it was not
+        there."""
+        preds = [None]*MAX_HEIGHT
+        succs = [None]*MAX_HEIGHT
+        victim = None
+        while True:
+            found = self.findNode(elem, preds, succs)
+            if victim == None:
+                if found == -1:
+                    return False
+                node = succs[found]
+                # A node found below its top level is not fully linked yet
+                if not node.fullyLinked or len(node.next) - 1 != found or \
+                        node.marked:
+                    return False
+                with node.lock:
+                    if node.marked:
+                        return False
+                    node.marked = True
+                victim = node
+
+            height = len(victim.next)
+            locked = self.lockPredecessors(preds, succs, height, victim)
+            try:
+                if locked == None:
+                    continue
+                for i in reversed(range(height)):
+                    preds[i].next[i] = victim.next[i]
+            finally:
+                self.unlock(locked)
+            with self.sizeLock:
+                self.len -= 1
+            return True
+
+    def lockPredecessors(self, preds, succs, height, victim = None):
+        """Locks preds[0..height), each node once, and checks they are
+        unmarked and still point to succs, or to victim when removing.
+        Returns the locked nodes, or None if the check failed, in which
+        case nothing is left locked."""
+        locked = []
+        for i in range(height):
+            pred = preds[i]
+            if not locked or locked[-1] is not pred:
+                pred.lock.acquire()
+                locked.append(pred)
+            if victim == None:
+                succ = succs[i]
+                valid = not pred.marked and pred.next[i] is succ and \
+                    (succ == None or not succ.marked)
+            else:
+                valid = not pred.marked and pred.next[i] is victim
+            if not valid:
+                self.unlock(locked)
+                return None
+        return locked
+
+    def unlock(self, locked):
+        if locked != None:
+            for node in locked:
+                node.lock.release()
@@ -0,0 +1,115 @@
+from concurrentSkipList import ConcurrentSkipList
+import threading
+import unittest
+from random import Random, seed
+import sys
+
+class ConcurrentSkipListTest(unittest.TestCase):
+
+    def setUp(self):
+        seed(0)
+        self.sl = ConcurrentSkipList()
+        # Switch threads as often as possible to interleave them more
+        self.switchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switchInterval)
+
+    def assertWellFormed(self):
+        # Every level is sorted and only holds elements of the level below
+        below = None
+        for i in range(self.sl.maxHeight):
+            level = []
+            x = self.sl.head.next[i]
+            while x != None:
+                self.assertFalse(x.marked)
+                level.append(x.elem)
+                x = x.next[i]
+            self.assertEqual(sorted(set(level)), level)
+            if below != None:
+                self.assertTrue(set(level) <= below)
+            below = set(level)
+
+    # Test a single thread
+
+    def testInsertContainsRemove(self):
+        self.assertTrue(self.sl.insert(2))
+        self.assertTrue(self.sl.insert(1))
+        self.assertFalse(self.sl.insert(1))
+        self.assertTrue(self.sl.contains(1))
+        self.assertEqual(2, len(self.sl))
+        self.assertTrue(self.sl.remove(1))
+        self.assertFalse(self.sl.remove(1))
+        self.assertFalse(self.sl.contains(1))
+        self.assertEqual([2], list(self.sl))
+        self.assertEqual(2, self.sl.find(2).elem)
+        self.assertEqual(None, self.sl.find(3))
+
+    # Test several threads
+
+    def runThreads(self, targets):
+        threads = [threading.Thread(target=target) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def testConcurrentInsertions(self):
+        n = 2000
+        def writer(start):
+            return lambda: [self.sl.insert(i) for i in range(start, n, 4)]
+        # Two writers per residue compete for the same elements
+        self.runThreads([writer(i % 4) for i in range(8)])
+        self.assertEqual(list(range(n)), list(self.sl))
+        self.assertEqual(n, len(self.sl))
+        self.assertWellFormed()
+
+    def testConcurrentInsertionsAndRemovals(self):
+        n = 4000
+        for i in range(0, n, 2):
+            self.sl.insert(i)
+        errors = []
+        done = []
+
+        def inserter():
+            rng = Random(1)
+            for i in rng.sample(range(1, n, 2), n // 2):
+                self.sl.insert(i)
+
+        def remover(rng):
+            def run():
+                for i in rng.sample(range(0, n, 2), n // 2):
+                    self.sl.remove(i)
+            return run
+
+        def reader():
+            # Odd elements are never removed once inserted, and every
+            # snapshot is sorted
+            seen = set()
+            while not done:
+                elems = list(self.sl)
+                if elems != sorted(set(elems)):
+                    errors.append(elems)
+                odd = set(i for i in elems if i % 2 == 1)
+                for i in seen:
+                    if not self.sl.contains(i):
+                        errors.append(i)
+                seen |= odd
+
+        readers = [threading.Thread(target=reader) for _ in range(2)]
+        for thread in readers:
+            thread.start()
+        self.runThreads([inserter, remover(Random(2)), remover(Random(3))])
+        done.append(True)
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(list(range(1, n, 2)), list(self.sl))
+        self.assertEqual(n // 2, len(self.sl))
+        self.assertWellFormed()
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -1,3 +1,5 @@
+from __future__ import print_function
+
 class Node:
 
     def __init__(self, elem):
@@ -34,6 +36,6 @@ class LinkedList:
     def printList(self):
         x = self.head.next
         while x != None:
-            print x.elem,
+            print(x.elem, end=' ')
             x = x.next
-        print ''
+        print('')
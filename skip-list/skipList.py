@@ -1,10 +1,29 @@
-from random import randint, seed
+from __future__ import print_function
+from random import getrandbits, seed
+
+class SkipNode(object):
+    """A node from a skip list.
+
+    links[2*i] is the next node on level i, and links[2*i + 1] the width
+    of that pointer: the number of level 0 steps it skips, i.e. the
+    difference between the positions of the next node and of this one.
+    A width is meaningless when the next node is None.
+
+    Pointers and widths share one list, and the node has no __dict__, only
+    the slots below, which saves most of the memory a node would otherwise
+    take."""
+    __slots__ = ('elem', 'links')
 
-class SkipNode:
-    """A node from a skip list"""    
     def __init__(self, height = 0, elem = None):
         self.elem = elem
-        self.next = [None]*height
+        self.links = [None, 0]*height
+
+    def height(self):
+        return len(self.links) // 2
+
+    def grow(self):
+        """Adds a level on top of the node."""
+        self.links += [None, 0]
 
 class SkipList:
 
@@ -12,6 +31,41 @@ class SkipList:
         self.head = SkipNode()
         self.len = 0
         self.maxHeight = 0
+        # update and positions found by the last updateList, see there
+        self.finger = []
+        self.fingerRanks = []
+
+    @classmethod
+    def from_sorted(cls, iterable):
+        """Builds a skip list from the elements of iterable, which must be
+        in increasing order. Repeated elements are kept once.
+
+        Nodes are appended at the end of each level they belong to, so the
+        list is built in one linear pass with no search at all."""
+        sl = cls()
+        # Last node of each level so far, and its position
+        last = []
+        lastPosition = []
+        for elem in iterable:
+            if sl.len > 0:
+                if elem == last[0].elem:
+                    continue
+                if elem < last[0].elem:
+                    raise ValueError('elements are not sorted')
+            height = sl.randomHeight()
+            node = SkipNode(height, elem)
+            sl.len += 1
+            while len(last) < height:
+                sl.head.grow()
+                last.append(sl.head)
+                lastPosition.append(0)
+            for i in range(height):
+                last[i].links[2*i] = node
+                last[i].links[2*i + 1] = sl.len - lastPosition[i]
+                last[i] = node
+                lastPosition[i] = sl.len
+        sl.maxHeight = sl.head.height()
+        return sl
 
     def __len__(self):
         return self.len
@@ -20,7 +74,7 @@ class SkipList:
         if update == None:
             update = self.updateList(elem)
         if len(update) > 0:
-            candidate = update[0].next[0]
+            candidate = update[0].links[0]
             if candidate != None and candidate.elem == elem:
                 return candidate
         return None
@@ -28,51 +82,279 @@ class SkipList:
     def contains(self, elem, update = None):
         return self.find(elem, update) != None
 
+    def __iter__(self):
+        """Yields the elements in increasing order."""
+        if self.maxHeight > 0:
+            return self.iterFrom(self.head.links[0])
+        return iter([])
+
+    def range(self, lo = None, hi = None):
+        """Yields, in increasing order, the elements e such that
+        lo <= e < hi. Either bound can be None for no bound.
+
+        The search for lo costs O(log n), then each element takes a step
+        on level 0, and nothing is copied. Like __iter__, it must not be
+        resumed after the list is modified."""
+        if lo == None:
+            x = iter(self)
+        else:
+            update = self.updateList(lo)
+            if len(update) == 0:
+                return
+            x = self.iterFrom(update[0].links[0])
+        for elem in x:
+            if hi != None and not elem < hi:
+                return
+            yield elem
+
+    def iterFrom(self, node):
+        """Yields the elements from node on, following level 0."""
+        while node != None:
+            yield node.elem
+            node = node.links[0]
+
+    def ceiling(self, elem):
+        """Smallest element >= elem, or None if there is none."""
+        update = self.updateList(elem)
+        if len(update) > 0 and update[0].links[0] != None:
+            return update[0].links[0].elem
+        return None
+
+    def floor(self, elem):
+        """Largest element <= elem, or None if there is none."""
+        update = self.updateList(elem)
+        if len(update) == 0:
+            return None
+        candidate = update[0].links[0]
+        if candidate != None and candidate.elem == elem:
+            return elem
+        # update[0] is the last node < elem
+        if update[0] is self.head:
+            return None
+        return update[0].elem
+
+    def rank(self, elem):
+        """Number of elements < elem, which is the index of elem if it is
+        in the list. Costs O(log n)."""
+        ranks = [0]*self.maxHeight
+        self.updateList(elem, ranks)
+        return ranks[0] if self.maxHeight > 0 else 0
+
+    def select(self, k):
+        """The k-th smallest element, counting from 0. Costs O(log n)."""
+        if not 0 <= k < self.len:
+            raise IndexError('skip list index out of range')
+        # Positions start at 1, the head is at 0
+        position = 0
+        x = self.head
+        for i in reversed(range(self.maxHeight)):
+            while x.links[2*i] != None and \
+                    position + x.links[2*i + 1] <= k + 1:
+                position += x.links[2*i + 1]
+                x = x.links[2*i]
+        return x.elem
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.len
+        return self.select(k)
+
     def randomHeight(self):
+        # Each bit is a coin flip: one random number gives all of them
+        bits = getrandbits(32)
         height = 1
-        while randint(1, 2) != 1:
+        while bits & 1:
             height += 1
+            bits >>= 1
         return height
 
-    def updateList(self, elem):
-        update = [None]*self.maxHeight
+    def updateList(self, elem, ranks = None):
+        """Returns update, where update[i] is the last node < elem on
+        level i. If ranks is given, ranks[i] is set to the position of
+        update[i].
+
+        The search resumes from the update list of the previous call, the
+        finger, when elem comes after it: it climbs the finger while the
+        next node is still < elem and goes down from there. Reaching an
+        element d positions further visits O(log d) nodes instead of
+        O(log n), though the finger itself is copied, which takes O(log n)
+        (see insert_many for a batch that avoids it). Smaller elements are
+        searched from the head."""
+        height = self.maxHeight
+        update = self.finger
+        positions = self.fingerRanks
+        if height > 0 and len(update) > 0 and \
+                (update[0] is self.head or update[0].elem < elem):
+            # Levels added since are entered from the head
+            update = update[:height] + [self.head]*(height - len(update))
+            positions = positions[:height] + [0]*(height - len(positions))
+            top = 0
+            while top < height - 1 and update[top].links[2*top] != None and \
+                    update[top].links[2*top].elem < elem:
+                top += 1
+        else:
+            update = [self.head]*height
+            positions = [0]*height
+            top = height - 1
+
+        # Levels above top are still right for elem
         x = self.head
-        for i in reversed(range(self.maxHeight)):
-            while x.next[i] != None and x.next[i].elem < elem:
-                x = x.next[i]
+        position = 0
+        for i in reversed(range(top + 1)):
+            # The finger may be further than where the level above ended
+            if positions[i] > position:
+                x = update[i]
+                position = positions[i]
+            while x.links[2*i] != None and x.links[2*i].elem < elem:
+                position += x.links[2*i + 1]
+                x = x.links[2*i]
             update[i] = x
+            positions[i] = position
+
+        self.finger = update
+        self.fingerRanks = positions
+        if ranks != None:
+            ranks[:] = positions
         return update
         
     def insert(self, elem):
 
-        node = SkipNode(self.randomHeight(), elem)
+        height = self.randomHeight()
+        node = SkipNode(height, elem)
 
-        self.maxHeight = max(self.maxHeight, len(node.next))
-        while len(self.head.next) < len(node.next):
-            self.head.next.append(None)
+        self.maxHeight = max(self.maxHeight, height)
+        while self.head.height() < height:
+            self.head.grow()
 
-        update = self.updateList(elem)            
+        ranks = [0]*self.maxHeight
+        update = self.updateList(elem, ranks)
         if self.find(elem, update) == None:
-            for i in range(len(node.next)):
-                node.next[i] = update[i].next[i]
-                update[i].next[i] = node
+            # The new node is at position ranks[0] + 1
+            for i in range(height):
+                links = update[i].links
+                node.links[2*i] = links[2*i]
+                node.links[2*i + 1] = links[2*i + 1] - ranks[0] + ranks[i]
+                links[2*i] = node
+                links[2*i + 1] = ranks[0] + 1 - ranks[i]
+            # Higher pointers now skip one more node
+            for i in range(height, self.maxHeight):
+                update[i].links[2*i + 1] += 1
             self.len += 1
+            # Move the finger past the new node, for the next insert
+            for i in range(height):
+                self.finger[i] = node
+                self.fingerRanks[i] = ranks[0] + 1
+
+    def insert_many(self, iterable):
+        """Inserts the elements of iterable. When they come in increasing
+        order, each search resumes from the update list of the previous
+        one, so inserting k elements close to each other costs O(k + log n)
+        rather than O(k log n). An element smaller than the previous one
+        is searched from the head again.
+
+        Unlike insert, the update list is kept in place, and the pointers
+        above a new node are not widened one by one. stamps[i] is the
+        length of the list when the width of update[i] on level i was last
+        right: every
+        element inserted since then went right after update[i] on level i,
+        so the missing width is len - stamps[i]. It is added only when
+        update[i] changes, or at the end."""
+        update = []
+        positions = []
+        stamps = []
+        try:
+            for elem in iterable:
+                height = self.randomHeight()
+                while self.head.height() < height:
+                    self.head.grow()
+                self.maxHeight = max(self.maxHeight, height)
+                while len(update) < self.maxHeight:
+                    update.append(self.head)
+                    positions.append(0)
+                    stamps.append(self.len)
+
+                if update[0] is not self.head and not update[0].elem < elem:
+                    if update[0].elem == elem:
+                        continue
+                    self.flushWidths(update, stamps)
+                    update = [self.head]*self.maxHeight
+                    positions = [0]*self.maxHeight
+                    stamps = [self.len]*self.maxHeight
+
+                top = 0
+                while top < self.maxHeight - 1 and \
+                        update[top].links[2*top] != None and \
+                        update[top].links[2*top].elem < elem:
+                    top += 1
+                # Levels above top are still right for elem
+                x = update[top]
+                position = positions[top]
+                for i in reversed(range(top + 1)):
+                    if positions[i] > position:
+                        x = update[i]
+                        position = positions[i]
+                    if x is update[i] and (x.links[2*i] == None or
+                                           not x.links[2*i].elem < elem):
+                        continue
+                    # update[i] changes: settle its width before walking
+                    update[i].links[2*i + 1] += self.len - stamps[i]
+                    while x.links[2*i] != None and x.links[2*i].elem < elem:
+                        position += x.links[2*i + 1]
+                        x = x.links[2*i]
+                    update[i] = x
+                    positions[i] = position
+                    stamps[i] = self.len
+
+                if update[0].links[0] != None and \
+                        update[0].links[0].elem == elem:
+                    continue
+                node = SkipNode(height, elem)
+                position = positions[0] + 1
+                for i in range(height):
+                    links = update[i].links
+                    links[2*i + 1] += self.len - stamps[i]
+                    node.links[2*i] = links[2*i]
+                    node.links[2*i + 1] = links[2*i + 1] - position + 1 + \
+                        positions[i]
+                    links[2*i] = node
+                    links[2*i + 1] = position - positions[i]
+                    update[i] = node
+                    positions[i] = position
+                self.len += 1
+                for i in range(height):
+                    stamps[i] = self.len
+        finally:
+            self.flushWidths(update, stamps)
+            self.finger = update
+            self.fingerRanks = positions
+
+    def flushWidths(self, update, stamps):
+        """Adds to the widths of the update list of insert_many the
+        elements inserted after them."""
+        for i in range(len(update)):
+            update[i].links[2*i + 1] += self.len - stamps[i]
+            stamps[i] = self.len
 
     def remove(self, elem):
 
         update = self.updateList(elem)
         x = self.find(elem, update)
         if x != None:
-            for i in reversed(range(len(x.next))):
-                update[i].next[i] = x.next[i]
-                if self.head.next[i] == None:
+            height = x.height()
+            for i in range(height, self.maxHeight):
+                update[i].links[2*i + 1] -= 1
+            for i in reversed(range(height)):
+                links = update[i].links
+                links[2*i] = x.links[2*i]
+                links[2*i + 1] += x.links[2*i + 1] - 1
+                if self.head.links[2*i] == None:
                     self.maxHeight -= 1
             self.len -= 1            
                 
     def printList(self):
-        for i in range(len(self.head.next)-1, -1, -1):
+        for i in range(self.head.height()-1, -1, -1):
             x = self.head
-            while x.next[i] != None:
-                print x.next[i].elem,
-                x = x.next[i]
-            print ''
+            while x.links[2*i] != None:
+                print(x.links[2*i].elem, end=' ')
+                x = x.links[2*i]
+            print('')
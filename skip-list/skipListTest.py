@@ -66,6 +66,136 @@ class SkipListTest(unittest.TestCase):
 
     def testFindingAnElementNotInTheList(self):
         self.assertEqual(None, self.sl.find(1))
+
+    # Test iteration
+
+    def testIterationIsSorted(self):
+        for elem in [5, 3, 8, 1, 3, 9]:
+            self.sl.insert(elem)
+        self.sl.remove(8)
+        self.assertEqual([1, 3, 5, 9], list(self.sl))
+
+    def testIterationOfAnEmptyList(self):
+        self.assertEqual([], list(self.sl))
+        self.sl.insert(1)
+        self.sl.remove(1)
+        self.assertEqual([], list(self.sl))
+
+    def testRange(self):
+        sl = SkipList.from_sorted(range(0, 20, 2))
+        self.assertEqual([4, 6, 8], list(sl.range(3, 10)))
+        self.assertEqual([4, 6], list(sl.range(4, 8)))
+        self.assertEqual([0, 2], list(sl.range(hi = 3)))
+        self.assertEqual([16, 18], list(sl.range(15)))
+        self.assertEqual([], list(sl.range(7, 8)))
+        self.assertEqual([], list(sl.range(30, 40)))
+
+    def testFloorAndCeiling(self):
+        sl = SkipList.from_sorted([10, 20, 30])
+        self.assertEqual(20, sl.floor(20))
+        self.assertEqual(20, sl.floor(25))
+        self.assertEqual(None, sl.floor(5))
+        self.assertEqual(30, sl.floor(100))
+        self.assertEqual(20, sl.ceiling(20))
+        self.assertEqual(30, sl.ceiling(25))
+        self.assertEqual(None, sl.ceiling(31))
+        self.assertEqual(10, sl.ceiling(-1))
+        self.assertEqual(None, self.sl.floor(1))
+        self.assertEqual(None, self.sl.ceiling(1))
+
+    # Test rank(elem) and select(k)
+
+    def testRankAndSelect(self):
+        elems = [randint(1, 1000) for _ in range(300)]
+        for elem in elems:
+            self.sl.insert(elem)
+        for elem in elems[::3]:
+            self.sl.remove(elem)
+        expected = sorted(set(elems) - set(elems[::3]))
+        self.assertEqual(len(expected), len(self.sl))
+        for k, elem in enumerate(expected):
+            self.assertEqual(elem, self.sl.select(k))
+            self.assertEqual(k, self.sl.rank(elem))
+        self.assertEqual(expected[-1], self.sl[-1])
+        self.assertEqual(0, self.sl.rank(0))
+        self.assertEqual(len(expected), self.sl.rank(1001))
+
+    def testSelectOutOfRange(self):
+        self.assertRaises(IndexError, self.sl.select, 0)
+        self.sl.insert(1)
+        self.assertEqual(1, self.sl[0])
+        self.assertRaises(IndexError, self.sl.select, 1)
+        self.assertRaises(IndexError, lambda: self.sl[-2])
+
+    def testRankAfterBuildingFromSortedElements(self):
+        sl = SkipList.from_sorted(range(0, 200, 2))
+        sl.insert(51)
+        self.assertEqual(26, sl.rank(51))
+        self.assertEqual(51, sl[26])
+        self.assertEqual(198, sl[100])
+
+    # Test insert_many(iterable) and searches from the finger
+
+    def testInsertManySortedElements(self):
+        sl = SkipList.from_sorted(range(0, 100, 10))
+        sl.insert_many(range(5, 100, 10))
+        self.assertEqual(list(range(0, 100, 5)), list(sl))
+        for k in range(20):
+            self.assertEqual(5*k, sl[k])
+
+    def testInsertManyUnsortedElements(self):
+        sl = SkipList.from_sorted(range(0, 100, 10))
+        sl.insert_many([45, 46, 46, 12, 95, 3, 50])
+        expected = sorted(set(range(0, 100, 10)) | set([45, 46, 12, 95, 3]))
+        self.assertEqual(expected, list(sl))
+        for k, elem in enumerate(expected):
+            self.assertEqual(elem, sl[k])
+            self.assertEqual(k, sl.rank(elem))
+
+    def testSearchesBehindTheFinger(self):
+        self.sl.insert_many([10, 20, 30, 40])
+        self.sl.insert(15)
+        self.sl.insert(5)
+        self.sl.remove(40)
+        self.sl.remove(30)
+        self.assertEqual(1, self.sl.rank(10))
+        self.sl.insert_many([35, 1, 36])
+        self.assertEqual([1, 5, 10, 15, 20, 35, 36], list(self.sl))
+        self.assertEqual(6, self.sl.rank(36))
+        self.assertTrue(self.sl.contains(10))
+        self.assertFalse(self.sl.contains(30))
+
+    def testRemovingEverythingKeepsTheFingerValid(self):
+        self.sl.insert_many(range(50))
+        for elem in range(50):
+            self.sl.remove(elem)
+        self.assertEqual(0, len(self.sl))
+        self.sl.insert_many([3, 1, 2])
+        self.assertEqual([1, 2, 3], list(self.sl))
+        self.assertEqual(2, self.sl[1])
+
+    # Test from_sorted(iterable)
+
+    def testBuildingFromSortedElements(self):
+        sl = SkipList.from_sorted([1, 2, 2, 3, 5, 8])
+        self.assertEqual(5, len(sl))
+        for elem in [1, 2, 3, 5, 8]:
+            self.assertTrue(sl.contains(elem))
+        self.assertFalse(sl.contains(4))
+        sl.insert(4)
+        sl.remove(1)
+        self.assertTrue(sl.contains(4))
+        self.assertFalse(sl.contains(1))
+        self.assertEqual(5, len(sl))
+
+    def testBuildingFromUnsortedElements(self):
+        self.assertRaises(ValueError, SkipList.from_sorted, [2, 1])
+
+    def testBuildingFromNoElements(self):
+        sl = SkipList.from_sorted([])
+        self.assertEqual(0, len(sl))
+        sl.insert(1)
+        self.assertTrue(sl.contains(1))
  
 if __name__ == '__main__':
 